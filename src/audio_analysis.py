@@ -1,14 +1,136 @@
+import os
+import multiprocessing
+import threading
 import numpy as np
 import librosa
+import soundfile as sf
+import soxr
+from numba import njit
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 from database import get_db
 
+# How many analyzed tracks batch_analyze writes per commit
+STORE_BATCH_SIZE = 50
+
+# Default analysis window: 60 s starting 30 s in to skip intros. Plenty
+# for BPM/key/energy and a fraction of the samples of a full track.
+# high_quality=True analyzes the whole file. Both modes run at the same
+# sample rate so stored spectral features (and valence) stay comparable.
+ANALYSIS_SR = 22050
+ANALYSIS_OFFSET = 30.0
+ANALYSIS_DURATION = 60.0
+
+# STFT frame parameters shared by every spectral feature
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Scale profiles for mode estimation, pre-rotated to all 12 keys and
+# mean-centred so a dot product ranks the same as Pearson correlation
+# (both profiles have seven notes, hence equal centred norms)
+MAJOR_PROFILE = np.array([1, 0, 1, 0, 1, 1, 0, 1, 0, 1, 0, 1], dtype=np.float32)
+MINOR_PROFILE = np.array([1, 0, 1, 1, 0, 1, 0, 1, 1, 0, 1, 0], dtype=np.float32)
+MAJOR_ROT = np.stack([np.roll(MAJOR_PROFILE, k) for k in range(12)])
+MINOR_ROT = np.stack([np.roll(MINOR_PROFILE, k) for k in range(12)])
+MAJOR_ROT -= MAJOR_ROT.mean(axis=1, keepdims=True)
+MINOR_ROT -= MINOR_ROT.mean(axis=1, keepdims=True)
+
+# STFT output buffer reused across analyze_audio calls, one per thread.
+# It is sized for the default analysis window, so it is allocated once per
+# thread; longer (high_quality) signals get a fresh array that isn't kept.
+_STFT_MAX_FRAMES = 1 + int(ANALYSIS_DURATION * ANALYSIS_SR) // HOP_LENGTH
+_stft_local = threading.local()
+
+
+def load_audio(
+    file_path: str | Path,
+    sr: int = ANALYSIS_SR,
+    offset: float = 0.0,
+    duration: Optional[float] = None,
+) -> np.ndarray:
+    """
+    Load an audio file (or a window of it) as mono float32 at sample rate sr.
+
+    Decodes through libsndfile and only resamples when the native rate
+    differs. Formats libsndfile can't read fall back to librosa.load.
+    If the file is too short for offset + duration, the window is moved
+    back towards the start so as much of duration as possible is read;
+    without a duration, an offset past the end reads the whole file.
+    """
+    try:
+        with sf.SoundFile(str(file_path)) as f:
+            sr_native = f.samplerate
+            start = int(offset * sr_native)
+            if duration:
+                frames = int(duration * sr_native)
+                start = max(0, min(start, f.frames - frames))
+            else:
+                start = start if start < f.frames else 0
+                frames = f.frames - start
+            f.seek(start)
+            y = f.read(frames, dtype="float32", always_2d=False)
+    except (sf.LibsndfileError, RuntimeError):
+        y, _ = librosa.load(file_path, sr=sr, mono=True, offset=offset,
+                            duration=duration, dtype=np.float32)
+        if not len(y) and offset:
+            y, _ = librosa.load(file_path, sr=sr, mono=True,
+                                duration=duration, dtype=np.float32)
+        return np.ascontiguousarray(y)
+
+    if y.ndim == 2:
+        y = y.mean(axis=1, dtype=np.float32)
+    if sr_native != sr:
+        y = soxr.resample(y, sr_native, sr)
+
+    return np.ascontiguousarray(y, dtype=np.float32)
+
+
+@njit(cache=True, fastmath=True)
+def _key_mode(chroma_mean, major_rot, minor_rot):
+    """
+    Key (strongest pitch class) and mode (1=major, 0=minor) from mean chroma.
 
-def analyze_audio(file_path: str | Path) -> dict:
+    Mode compares the mean-centred chroma against the major and minor
+    scale profiles rotated to the key, in the same pass.
+    """
+    key = 0
+    total = 0.0
+    for i in range(12):
+        total += chroma_mean[i]
+        if chroma_mean[i] > chroma_mean[key]:
+            key = i
+    mean = total / 12
+    major_score = 0.0
+    minor_score = 0.0
+    for i in range(12):
+        centered = chroma_mean[i] - mean
+        major_score += major_rot[key, i] * centered
+        minor_score += minor_rot[key, i] * centered
+    return key, 1 if major_score > minor_score else 0
+
+
+def _stft_out(n_bins: int, n_frames: int) -> np.ndarray:
+    """Return this thread's STFT buffer, or a new array if it can't hold the signal."""
+    if n_frames > _STFT_MAX_FRAMES:
+        return np.empty((n_bins, n_frames), dtype=np.complex64, order="F")
+    buf = getattr(_stft_local, "buf", None)
+    if buf is None or buf.shape[0] != n_bins:
+        buf = np.empty((n_bins, _STFT_MAX_FRAMES), dtype=np.complex64, order="F")
+        _stft_local.buf = buf
+    return buf
+
+
+def analyze_audio(
+    file_path: str | Path, high_quality: bool = False, stft_chroma: bool = False
+) -> dict:
     """
     Analyze an audio file and extract DJ-relevant features.
 
+    By default only a 60 s window is analyzed; high_quality analyzes the
+    full track. Key detection uses constant-Q chroma; stft_chroma derives
+    it from the shared STFT instead, which is faster but less accurate
+    (upper partials can pull the key to the fifth).
+
     Returns dict with: bpm, energy, key, mode, loudness, danceability, valence estimates
     """
     file_path = Path(file_path)
@@ -16,54 +138,70 @@ def analyze_audio(file_path: str | Path) -> dict:
         raise FileNotFoundError(f"Audio file not found: {file_path}")
 
     # Load audio (mono, standard sample rate)
-    y, sr = librosa.load(file_path, sr=22050, mono=True)
+    sr = ANALYSIS_SR
+    if high_quality:
+        y = load_audio(file_path, sr=sr)
+    else:
+        y = load_audio(file_path, sr=sr, offset=ANALYSIS_OFFSET,
+                       duration=ANALYSIS_DURATION)
+
+    n_fft = N_FFT
+    hop_length = HOP_LENGTH
 
     features = {}
 
-    # BPM detection
-    tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
+    # One STFT for all spectral features (magnitude + power), plus the
+    # log-mel spectrogram that both onset envelopes are derived from.
+    # Everything stays float32; the features are only ever averaged.
+    out = _stft_out(1 + n_fft // 2, 1 + len(y) // hop_length)
+    D = librosa.stft(y, n_fft=n_fft, hop_length=hop_length, dtype=np.complex64, out=out)
+    S = np.abs(D)
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft).astype(np.float32)
+    S_power = S ** 2
+    mel = librosa.feature.melspectrogram(S=S_power, sr=sr, n_fft=n_fft)
+    mel_db = librosa.power_to_db(mel)
+
+    # BPM detection (beat_track's own onset envelope uses a median aggregate)
+    tempo_env = librosa.onset.onset_strength(
+        S=mel_db, sr=sr, hop_length=hop_length, aggregate=np.median
+    )
+    tempo, beat_frames = librosa.beat.beat_track(
+        onset_envelope=tempo_env, sr=sr, hop_length=hop_length
+    )
     features["bpm"] = float(tempo[0]) if hasattr(tempo, '__len__') else float(tempo)
 
     # RMS Energy (0-1 normalized)
-    rms = librosa.feature.rms(y=y)[0]
+    rms = librosa.feature.rms(y=y, frame_length=n_fft, hop_length=hop_length)[0]
     features["energy"] = float(np.mean(rms) / np.max(rms)) if np.max(rms) > 0 else 0.0
 
     # Loudness (dB, typically -60 to 0)
     features["loudness"] = float(20 * np.log10(np.mean(rms) + 1e-10))
 
     # Spectral features for "vibe" estimation
-    spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
+    spectral_centroid = librosa.feature.spectral_centroid(S=S, sr=sr, freq=freqs)[0]
     features["spectral_centroid"] = float(np.mean(spectral_centroid))
 
-    spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
+    spectral_rolloff = librosa.feature.spectral_rolloff(S=S, sr=sr, freq=freqs)[0]
     features["spectral_rolloff"] = float(np.mean(spectral_rolloff))
 
     # Zero crossing rate (higher = more percussive/noisy)
-    zcr = librosa.feature.zero_crossing_rate(y)[0]
+    zcr = librosa.feature.zero_crossing_rate(y, frame_length=n_fft, hop_length=hop_length)[0]
     features["zero_crossing_rate"] = float(np.mean(zcr))
 
-    # Key detection using chroma features
-    chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
-    chroma_mean = np.mean(chroma, axis=1)
-    features["key"] = int(np.argmax(chroma_mean))  # 0-11 (C, C#, D, ...)
-
-    # Mode estimation (major vs minor) - simplified
-    # Compare major vs minor chord profiles
-    major_profile = np.array([1, 0, 1, 0, 1, 1, 0, 1, 0, 1, 0, 1])  # Major scale
-    minor_profile = np.array([1, 0, 1, 1, 0, 1, 0, 1, 1, 0, 1, 0])  # Minor scale
-
-    # Rotate profiles to detected key
-    key = features["key"]
-    major_rotated = np.roll(major_profile, key)
-    minor_rotated = np.roll(minor_profile, key)
-
-    major_corr = np.corrcoef(chroma_mean, major_rotated)[0, 1]
-    minor_corr = np.corrcoef(chroma_mean, minor_rotated)[0, 1]
-    features["mode"] = 1 if major_corr > minor_corr else 0  # 1=major, 0=minor
+    # Key detection using chroma features (constant-Q unless the cheaper
+    # chroma from the shared power spectrogram is asked for)
+    if stft_chroma:
+        chroma = librosa.feature.chroma_stft(S=S_power, sr=sr, n_fft=n_fft, n_chroma=12)
+    else:
+        chroma = librosa.feature.chroma_cqt(y=y, sr=sr, hop_length=hop_length)
+    chroma_mean = chroma.mean(axis=1, dtype=np.float32)
+    key, mode = _key_mode(chroma_mean, MAJOR_ROT, MINOR_ROT)
+    features["key"] = int(key)  # 0-11 (C, C#, D, ...)
+    features["mode"] = int(mode)  # 1=major, 0=minor
 
     # Danceability estimate (based on beat strength and tempo regularity)
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-    pulse = librosa.beat.plp(onset_envelope=onset_env, sr=sr)
+    onset_env = librosa.onset.onset_strength(S=mel_db, sr=sr, hop_length=hop_length)
+    pulse = librosa.beat.plp(onset_envelope=onset_env, sr=sr, hop_length=hop_length)
     features["danceability"] = float(np.mean(pulse))
 
     # Valence estimate (brightness/positivity proxy)
@@ -75,42 +213,71 @@ def analyze_audio(file_path: str | Path) -> dict:
     return features
 
 
-def analyze_and_store(track_id: str, file_path: str | Path) -> dict:
-    """Analyze audio and store features in database."""
-    features = analyze_audio(file_path)
+def _store_features(
+    conn, track_id: str, features: dict, file_mtime: Optional[float] = None
+) -> None:
+    """Store analyzed audio features (internal, uses existing connection)."""
+    conn.execute("""
+        INSERT INTO audio_features
+            (track_id, bpm, energy, danceability, valence, loudness,
+             key, mode, spectral_centroid, spectral_rolloff, zero_crossing_rate,
+             file_mtime)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(track_id) DO UPDATE SET
+            bpm = excluded.bpm,
+            energy = excluded.energy,
+            danceability = excluded.danceability,
+            valence = excluded.valence,
+            loudness = excluded.loudness,
+            key = excluded.key,
+            mode = excluded.mode,
+            spectral_centroid = excluded.spectral_centroid,
+            spectral_rolloff = excluded.spectral_rolloff,
+            zero_crossing_rate = excluded.zero_crossing_rate,
+            file_mtime = excluded.file_mtime,
+            analyzed_at = CURRENT_TIMESTAMP
+    """, (
+        track_id,
+        features["bpm"],
+        features["energy"],
+        features["danceability"],
+        features["valence"],
+        features["loudness"],
+        features["key"],
+        features["mode"],
+        features["spectral_centroid"],
+        features["spectral_rolloff"],
+        features["zero_crossing_rate"],
+        file_mtime,
+    ))
+
+
+def store_features(
+    track_id: str, features: dict, file_mtime: Optional[float] = None
+) -> None:
+    """
+    Store analyzed audio features in database.
 
+    file_mtime is the analyzed file's modification time, which lets
+    batch_analyze skip the file until it changes.
+    """
     with get_db() as conn:
-        conn.execute("""
-            INSERT INTO audio_features
-                (track_id, bpm, energy, danceability, valence, loudness,
-                 key, mode, spectral_centroid, spectral_rolloff, zero_crossing_rate)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(track_id) DO UPDATE SET
-                bpm = excluded.bpm,
-                energy = excluded.energy,
-                danceability = excluded.danceability,
-                valence = excluded.valence,
-                loudness = excluded.loudness,
-                key = excluded.key,
-                mode = excluded.mode,
-                spectral_centroid = excluded.spectral_centroid,
-                spectral_rolloff = excluded.spectral_rolloff,
-                zero_crossing_rate = excluded.zero_crossing_rate,
-                analyzed_at = CURRENT_TIMESTAMP
-        """, (
-            track_id,
-            features["bpm"],
-            features["energy"],
-            features["danceability"],
-            features["valence"],
-            features["loudness"],
-            features["key"],
-            features["mode"],
-            features["spectral_centroid"],
-            features["spectral_rolloff"],
-            features["zero_crossing_rate"],
-        ))
+        _store_features(conn, track_id, features, file_mtime)
 
+
+def _file_mtime(file_path: str | Path) -> Optional[float]:
+    """Modification time of file_path, or None if it can't be stat'ed."""
+    try:
+        return os.stat(file_path).st_mtime
+    except OSError:
+        return None
+
+
+def analyze_and_store(track_id: str, file_path: str | Path) -> dict:
+    """Analyze audio and store features in database."""
+    file_mtime = _file_mtime(file_path)
+    features = analyze_audio(file_path)
+    store_features(track_id, features, file_mtime)
     return features
 
 
@@ -128,34 +295,99 @@ def get_key_name(key: int, mode: int) -> str:
     return f"{key_name} {mode_name} ({camelot})"
 
 
-def batch_analyze(file_paths: list[tuple[str, Path]], progress_callback=None) -> dict:
+def _analyze_worker(job: tuple[str, str | Path]) -> tuple[str, Optional[dict], Optional[str]]:
+    """Analyze one file in a worker process. Returns (track_id, features, error)."""
+    track_id, file_path = job
+    try:
+        return track_id, analyze_audio(file_path), None
+    except Exception as e:
+        return track_id, None, str(e)
+
+
+def _iter_analyses(file_paths: list[tuple[str, Path]], workers: int):
+    """Yield (track_id, features, error) for each file as it finishes."""
+    if workers <= 1:
+        yield from map(_analyze_worker, file_paths)
+        return
+
+    # "spawn" avoids fork + librosa/OpenMP deadlocks in the children
+    ctx = multiprocessing.get_context("spawn")
+    chunksize = max(1, len(file_paths) // (workers * 4))
+    with ctx.Pool(workers) as pool:
+        yield from pool.imap_unordered(_analyze_worker, file_paths, chunksize=chunksize)
+
+
+def batch_analyze(
+    file_paths: list[tuple[str, Path]],
+    progress_callback=None,
+    workers: Optional[int] = None,
+    force: bool = False,
+    result_sink: Optional[Callable[[dict], None]] = None,
+) -> dict:
     """
-    Analyze multiple files.
+    Analyze multiple files in parallel.
 
     file_paths: list of (track_id, file_path) tuples
-    Returns: dict with success/failure counts and results
+    workers: number of analysis processes (default: CPU count, 1 = no pool)
+    force: re-analyze files whose stored features are already up to date
+    result_sink: called with each per-track record instead of collecting
+        them in results["tracks"], so memory stays flat on large libraries
+    Returns: dict with success/failed/skipped counts and results
+
+    Files whose modification time matches the one stored with their
+    features are skipped. Feature extraction runs in worker processes;
+    database writes stay in this process on one connection, committed
+    every STORE_BATCH_SIZE tracks.
     """
-    results = {"success": 0, "failed": 0, "tracks": []}
-
-    for i, (track_id, file_path) in enumerate(file_paths):
-        try:
-            features = analyze_and_store(track_id, file_path)
-            results["success"] += 1
-            results["tracks"].append({
-                "track_id": track_id,
-                "bpm": features["bpm"],
-                "key": get_key_name(features["key"], features["mode"]),
-                "energy": features["energy"],
-            })
-        except Exception as e:
-            results["failed"] += 1
-            results["tracks"].append({
-                "track_id": track_id,
-                "error": str(e),
-            })
-
-        if progress_callback:
-            progress_callback(i + 1, len(file_paths))
+    results = {"success": 0, "failed": 0, "skipped": 0, "tracks": []}
+    if result_sink is None:
+        result_sink = results["tracks"].append
+
+    with get_db() as conn:
+        mtimes = {track_id: _file_mtime(path) for track_id, path in file_paths}
+        if not force:
+            stored = dict(conn.execute(
+                "SELECT track_id, file_mtime FROM audio_features "
+                "WHERE file_mtime IS NOT NULL"
+            ).fetchall())
+            pending = [
+                (track_id, path) for track_id, path in file_paths
+                if mtimes[track_id] is None or stored.get(track_id) != mtimes[track_id]
+            ]
+            results["skipped"] = len(file_paths) - len(pending)
+            file_paths = pending
+
+        total = len(file_paths)
+        workers = min(workers or os.cpu_count() or 1, total) if total else 1
+
+        outcomes = _iter_analyses(file_paths, workers)
+        for i, (track_id, features, error) in enumerate(outcomes, 1):
+            if features is not None:
+                try:
+                    _store_features(conn, track_id, features, mtimes[track_id])
+                except Exception as e:
+                    features, error = None, str(e)
+
+            if features is not None:
+                results["success"] += 1
+                result_sink({
+                    "track_id": track_id,
+                    "bpm": features["bpm"],
+                    "key": get_key_name(features["key"], features["mode"]),
+                    "energy": features["energy"],
+                })
+            else:
+                results["failed"] += 1
+                result_sink({
+                    "track_id": track_id,
+                    "error": error,
+                })
+
+            if i % STORE_BATCH_SIZE == 0:
+                conn.commit()
+
+            if progress_callback:
+                progress_callback(i, total)
 
     return results
 
@@ -6,11 +6,12 @@ Sign up at: https://getsongbpm.com/api
 """
 
 import os
-import time
 import requests
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
 from database import get_db
 from dotenv import load_dotenv
+from rate_limit import LeakyBucket, RateLimitedSession
 
 load_dotenv()
 
@@ -18,10 +19,31 @@ GETSONGBPM_API_KEY = os.getenv("GETSONGBPM_API_KEY")
 BASE_URL = "https://api.getsongbpm.com"
 
 
-def search_song(artist: str, title: str) -> Optional[dict]:
+def _make_session(delay: float, concurrent: int) -> RateLimitedSession:
+    """
+    Pooled keep-alive session with calls spaced at least `delay` seconds apart.
+
+    A one-token bucket refilled every `delay` seconds; 429s and 5xx are
+    retried by RateLimitedSession.
+    """
+    # A zero delay still needs a (tiny) refill period
+    bucket = LeakyBucket(rate=1, per=max(delay, 1e-3), concurrent=concurrent)
+    session = RateLimitedSession(bucket)
+    session.headers.update({"User-Agent": "dj-playlist-organizer"})
+    return session
+
+
+# Shared session for one-off lookups (be nice to the free API)
+_SESSION = _make_session(delay=0.5, concurrent=4)
+
+
+def search_song(
+    artist: str, title: str, session: Optional[requests.Session] = None
+) -> Optional[dict]:
     """
     Search for a song on GetSongBPM.
 
+    session: rate-limited session to send the request on (default: shared)
     Returns dict with: id, title, artist, tempo, key_of, time_sig, etc.
     """
     if not GETSONGBPM_API_KEY:
@@ -38,7 +60,8 @@ def search_song(artist: str, title: str) -> Optional[dict]:
     }
 
     try:
-        response = requests.get(f"{BASE_URL}/search/", params=params, timeout=10)
+        session = session or _SESSION
+        response = session.get(f"{BASE_URL}/search/", params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
 
@@ -63,7 +86,7 @@ def get_song_details(song_id: str) -> Optional[dict]:
     }
 
     try:
-        response = requests.get(f"{BASE_URL}/song/", params=params, timeout=10)
+        response = _SESSION.get(f"{BASE_URL}/song/", params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
         return data.get("song")
@@ -72,13 +95,18 @@ def get_song_details(song_id: str) -> Optional[dict]:
         return None
 
 
-def fetch_and_store_bpm(track_id: str, artist: str, title: str) -> Optional[dict]:
+def fetch_and_store_bpm(
+    track_id: str,
+    artist: str,
+    title: str,
+    session: Optional[requests.Session] = None,
+) -> Optional[dict]:
     """
     Fetch BPM data from API and store in database.
 
     Returns the audio features dict or None if not found.
     """
-    result = search_song(artist, title)
+    result = search_song(artist, title, session)
 
     if not result:
         return None
@@ -148,11 +176,30 @@ def fetch_and_store_bpm(track_id: str, artist: str, title: str) -> Optional[dict
     return features
 
 
-def fetch_all_tracks_bpm(rate_limit_delay: float = 0.5) -> dict:
+def _print_bpm_result(record: dict) -> None:
+    """Default fetch_all_tracks_bpm sink: one progress line per track."""
+    prefix = f"  [{record['index']}/{record['total']}] {record['track']}"
+    if record["status"] == "found":
+        print(prefix)
+        print(f"           BPM: {record['bpm']:.0f}, Key: {record['key']}")
+    elif record["status"] == "not_found":
+        print(f"{prefix} [NOT FOUND]")
+    else:
+        print(f"{prefix} [ERROR: {record['error']}]")
+
+
+def fetch_all_tracks_bpm(
+    rate_limit_delay: float = 0.5,
+    max_workers: int = 4,
+    result_sink: Optional[Callable[[dict], None]] = None,
+) -> dict:
     """
     Fetch BPM for all tracks in database.
 
-    rate_limit_delay: seconds between API calls (be nice to free API)
+    rate_limit_delay: minimum seconds between API calls (be nice to free API)
+    max_workers: concurrent requests in flight; the call rate stays capped
+                 by rate_limit_delay, workers just overlap network latency
+    result_sink: called with each per-track record (default: print it)
     """
     if not GETSONGBPM_API_KEY:
         print("ERROR: GETSONGBPM_API_KEY not set in .env")
@@ -178,24 +225,35 @@ def fetch_all_tracks_bpm(rate_limit_delay: float = 0.5) -> dict:
     print(f"Fetching BPM for {len(tracks)} tracks...")
     print("-" * 50)
 
-    for i, (track_id, name, artist) in enumerate(tracks):
-        try:
-            features = fetch_and_store_bpm(track_id, artist, name)
+    if result_sink is None:
+        result_sink = _print_bpm_result
+
+    session = _make_session(rate_limit_delay, max_workers)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch_and_store_bpm, track_id, artist, name, session): (artist, name)
+            for track_id, name, artist in tracks
+        }
+
+        for i, future in enumerate(as_completed(futures), 1):
+            artist, name = futures[future]
+            record = {"index": i, "total": len(tracks), "track": f"{artist} - {name}"}
+            try:
+                features = future.result()
 
-            if features:
-                results["found"] += 1
-                print(f"  [{i+1}/{len(tracks)}] {artist} - {name}")
-                print(f"           BPM: {features['bpm']:.0f}, Key: {features['key']}")
-            else:
-                results["not_found"] += 1
-                print(f"  [{i+1}/{len(tracks)}] {artist} - {name} [NOT FOUND]")
+                if features:
+                    results["found"] += 1
+                    record.update(status="found", bpm=features["bpm"], key=features["key"])
+                else:
+                    results["not_found"] += 1
+                    record["status"] = "not_found"
 
-            # Rate limiting
-            time.sleep(rate_limit_delay)
+            except Exception as e:
+                results["errors"] += 1
+                record.update(status="error", error=str(e))
 
-        except Exception as e:
-            results["errors"] += 1
-            print(f"  [{i+1}/{len(tracks)}] {artist} - {name} [ERROR: {e}]")
+            result_sink(record)
 
     return results
 
@@ -1,4 +1,5 @@
 import sqlite3
+import threading
 from pathlib import Path
 from datetime import datetime
 from typing import Optional
@@ -6,23 +7,81 @@ from contextlib import contextmanager
 
 DB_PATH = Path(__file__).parent.parent / "data" / "dj_library.db"
 
+# One open connection per thread, reused by every get_db() call
+_local = threading.local()
 
-@contextmanager
-def get_db():
-    """Context manager for database connections."""
+
+def _connect() -> sqlite3.Connection:
+    """Open a new connection to DB_PATH with the standard pragmas."""
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    # Connections live for the whole thread, so keep more compiled
+    # statements around than the default 100
+    conn = sqlite3.connect(DB_PATH, cached_statements=256)
     conn.row_factory = sqlite3.Row
+    # NORMAL sync is safe under WAL (set once in init_db): one fsync per
+    # checkpoint instead of two per commit
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA wal_autocheckpoint=1000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # 64 MiB page cache and memory-mapped reads for the large JOINs
+    conn.execute("PRAGMA cache_size=-65536")
+    conn.execute("PRAGMA mmap_size=268435456")
+    return conn
+
+
+@contextmanager
+def get_db():
+    """
+    Context manager for the calling thread's database connection.
+
+    The connection is opened on first use and kept for later calls. The
+    outermost block commits on success and rolls back on error.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != DB_PATH:
+        close_db()
+        conn = _local.conn = _connect()
+        _local.path = DB_PATH
+        _local.depth = 0
+
+    _local.depth += 1
     try:
         yield conn
-        conn.commit()
+    except BaseException:
+        if _local.depth == 1:
+            conn.rollback()
+        raise
+    else:
+        if _local.depth == 1:
+            conn.commit()
     finally:
+        _local.depth -= 1
+
+
+def close_db():
+    """Close the calling thread's cached connection, if any."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _local.conn = None
         conn.close()
 
 
+def _ensure_column(conn, table: str, column: str, decl: str) -> bool:
+    """Add a column to an existing table if missing. Returns True if added."""
+    columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column in columns:
+        return False
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    return True
+
+
 def init_db():
     """Initialize database schema."""
     with get_db() as conn:
+        # WAL persists in the database file, so readers (playlist generation)
+        # aren't blocked by a running sync. Lost tail writes on a crash are
+        # all re-fetchable from Spotify.
+        conn.execute("PRAGMA journal_mode=WAL")
         conn.executescript("""
             -- Tracks from Spotify
             CREATE TABLE IF NOT EXISTS tracks (
@@ -42,6 +101,7 @@ def init_db():
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 track_id TEXT NOT NULL,
                 played_at TIMESTAMP NOT NULL,
+                hour_of_day INTEGER,
                 source TEXT DEFAULT 'spotify',
                 FOREIGN KEY (track_id) REFERENCES tracks(id),
                 UNIQUE(track_id, played_at)
@@ -71,6 +131,7 @@ def init_db():
                 spectral_centroid REAL,
                 spectral_rolloff REAL,
                 zero_crossing_rate REAL,
+                file_mtime REAL,
                 analyzed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (track_id) REFERENCES tracks(id)
             );
@@ -107,31 +168,67 @@ def init_db():
                 PRIMARY KEY (track_id, time_range),
                 FOREIGN KEY (track_id) REFERENCES tracks(id)
             );
+        """)
+
+        # Columns added after the original schema
+        _ensure_column(conn, "audio_features", "file_mtime", "REAL")
+        if _ensure_column(conn, "plays", "hour_of_day", "INTEGER"):
+            conn.execute("""
+                UPDATE plays SET hour_of_day = CAST(strftime('%H', played_at) AS INTEGER)
+            """)
 
+        conn.executescript("""
             -- Indexes for common queries
             CREATE INDEX IF NOT EXISTS idx_plays_track ON plays(track_id);
             CREATE INDEX IF NOT EXISTS idx_plays_time ON plays(played_at);
             CREATE INDEX IF NOT EXISTS idx_track_stats_count ON track_stats(play_count DESC);
             CREATE INDEX IF NOT EXISTS idx_audio_bpm ON audio_features(bpm);
             CREATE INDEX IF NOT EXISTS idx_audio_energy ON audio_features(energy);
+            -- Folder queries filter on vibe_id; covering, so they never read
+            -- track_vibes rows
+            CREATE INDEX IF NOT EXISTS idx_track_vibes_vibe_track
+                ON track_vibes(vibe_id, track_id, confidence);
+            -- Covering indexes for the feature and play-count columns folder
+            -- queries join in by track_id
+            CREATE INDEX IF NOT EXISTS idx_audio_track_features
+                ON audio_features(track_id, bpm, energy, valence, danceability, key, mode);
+            CREATE INDEX IF NOT EXISTS idx_track_stats_track_plays
+                ON track_stats(track_id, play_count);
+            -- Matched-track queries filter on local_path IS NOT NULL; the
+            -- unmatched (IS NULL) side is most of the table and is scanned
+            CREATE INDEX IF NOT EXISTS idx_tracks_local ON tracks(local_path)
+                WHERE local_path IS NOT NULL;
+            -- Time-of-day playlists count plays per track within an hour window
+            CREATE INDEX IF NOT EXISTS idx_plays_hour ON plays(hour_of_day, track_id);
         """)
+
+        # Refresh planner statistics for the indexes above when worthwhile
+        conn.execute("PRAGMA optimize")
         print(f"Database initialized at {DB_PATH}")
 
 
+_UPSERT_TRACK_SQL = """
+    INSERT INTO tracks (id, name, artist, album, duration_ms, uri, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(id) DO UPDATE SET
+        name = excluded.name,
+        artist = excluded.artist,
+        album = excluded.album,
+        duration_ms = excluded.duration_ms,
+        uri = excluded.uri,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+
+def _track_row(track: dict) -> tuple:
+    """Parameters for _UPSERT_TRACK_SQL."""
+    return (track["id"], track["name"], track["artist"],
+            track.get("album"), track.get("duration_ms"), track.get("uri"))
+
+
 def _upsert_track(conn, track: dict) -> None:
     """Insert or update a track (internal, uses existing connection)."""
-    conn.execute("""
-        INSERT INTO tracks (id, name, artist, album, duration_ms, uri, updated_at)
-        VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        ON CONFLICT(id) DO UPDATE SET
-            name = excluded.name,
-            artist = excluded.artist,
-            album = excluded.album,
-            duration_ms = excluded.duration_ms,
-            uri = excluded.uri,
-            updated_at = CURRENT_TIMESTAMP
-    """, (track["id"], track["name"], track["artist"],
-          track.get("album"), track.get("duration_ms"), track.get("uri")))
+    conn.execute(_UPSERT_TRACK_SQL, _track_row(track))
 
 
 def upsert_track(track: dict) -> None:
@@ -140,24 +237,44 @@ def upsert_track(track: dict) -> None:
         _upsert_track(conn, track)
 
 
+def upsert_tracks_bulk(tracks: list[dict]) -> None:
+    """Insert or update many tracks in one transaction."""
+    with get_db() as conn:
+        conn.executemany(_UPSERT_TRACK_SQL, [_track_row(t) for t in tracks])
+
+
+# Play event insert, bucketing the hour the same way SQLite parses it
+_RECORD_PLAY_SQL = """
+    INSERT OR IGNORE INTO plays (track_id, played_at, hour_of_day)
+    VALUES (?1, ?2, CAST(strftime('%H', ?2) AS INTEGER))
+"""
+
+_UPDATE_STATS_SQL = """
+    INSERT INTO track_stats (track_id, play_count, first_played, last_played)
+    VALUES (?1, 1, ?2, ?2)
+    ON CONFLICT(track_id) DO UPDATE SET
+        play_count = play_count + 1,
+        first_played = MIN(first_played, excluded.first_played),
+        last_played = MAX(last_played, excluded.last_played)
+"""
+
+
+def _record_plays(conn, plays: list[tuple[str, str]]) -> None:
+    """Record (track_id, played_at) play events and update stats (internal)."""
+    conn.executemany(_RECORD_PLAY_SQL, plays)
+    conn.executemany(_UPDATE_STATS_SQL, plays)
+
+
 def record_play(track_id: str, played_at: str) -> None:
     """Record a play event and update stats."""
     with get_db() as conn:
-        # Insert play event
-        conn.execute("""
-            INSERT OR IGNORE INTO plays (track_id, played_at)
-            VALUES (?, ?)
-        """, (track_id, played_at))
-
-        # Update aggregated stats
-        conn.execute("""
-            INSERT INTO track_stats (track_id, play_count, first_played, last_played)
-            VALUES (?, 1, ?, ?)
-            ON CONFLICT(track_id) DO UPDATE SET
-                play_count = play_count + 1,
-                first_played = MIN(first_played, excluded.first_played),
-                last_played = MAX(last_played, excluded.last_played)
-        """, (track_id, played_at, played_at))
+        _record_plays(conn, [(track_id, played_at)])
+
+
+def record_plays_bulk(plays: list[tuple[str, str]]) -> None:
+    """Record many (track_id, played_at) play events in one transaction."""
+    with get_db() as conn:
+        _record_plays(conn, plays)
 
 
 def save_top_tracks(tracks: list[dict], time_range: str) -> None:
@@ -166,12 +283,11 @@ def save_top_tracks(tracks: list[dict], time_range: str) -> None:
         # Clear old rankings for this time range
         conn.execute("DELETE FROM top_tracks WHERE time_range = ?", (time_range,))
 
-        for track in tracks:
-            _upsert_track(conn, track)
-            conn.execute("""
-                INSERT INTO top_tracks (track_id, time_range, rank)
-                VALUES (?, ?, ?)
-            """, (track["id"], time_range, track["rank"]))
+        conn.executemany(_UPSERT_TRACK_SQL, [_track_row(t) for t in tracks])
+        conn.executemany("""
+            INSERT INTO top_tracks (track_id, time_range, rank)
+            VALUES (?, ?, ?)
+        """, [(t["id"], time_range, t["rank"]) for t in tracks])
 
 
 def get_most_played(limit: int = 50) -> list[dict]:
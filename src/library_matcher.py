@@ -1,41 +1,71 @@
 import os
 import re
 from pathlib import Path
-from difflib import SequenceMatcher
-from typing import Optional
+from typing import Callable, Optional
+import numpy as np
+from numba import njit
+from rapidfuzz import fuzz
 from database import get_db
 
 # Supported audio formats
 AUDIO_EXTENSIONS = {".mp3", ".flac", ".wav", ".aiff", ".aif", ".m4a", ".ogg", ".opus"}
 
 
+_TRACK_NUMBER_RE = re.compile(r"^\d+[\.\-_\s]+")
+_NON_WORD_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+_SUFFIX_RE = re.compile(
+    r"\s*(original mix|extended mix|radio edit|remix|remaster(ed)?)\s*$", re.I
+)
+
+
 def scan_music_directory(music_dir: str | Path) -> list[dict]:
     """
     Scan a directory for audio files.
 
-    Returns list of dicts with: path, filename, artist_guess, title_guess
+    Returns list of dicts with: path, filename, artist_guess, title_guess,
+    plus pre-normalized title_norm, artist_norm and title_chars (sorted
+    code points of title_norm) for matching
     """
     music_dir = Path(music_dir)
     if not music_dir.exists():
         raise FileNotFoundError(f"Directory not found: {music_dir}")
 
     files = []
-    for root, dirs, filenames in os.walk(music_dir):
-        for filename in filenames:
-            ext = Path(filename).suffix.lower()
-            if ext in AUDIO_EXTENSIONS:
-                file_path = Path(root) / filename
-                parsed = parse_filename(filename)
-                files.append({
-                    "path": str(file_path),
-                    "filename": filename,
-                    "artist_guess": parsed.get("artist"),
-                    "title_guess": parsed.get("title"),
-                })
+    for file_path, filename in _iter_audio_files(str(music_dir)):
+        parsed = parse_filename(filename)
+        title_norm = normalize_string(parsed.get("title") or filename)
+        files.append({
+            "path": file_path,
+            "filename": filename,
+            "artist_guess": parsed.get("artist"),
+            "title_guess": parsed.get("title"),
+            "title_norm": title_norm,
+            "artist_norm": normalize_string(parsed.get("artist") or ""),
+            "title_chars": _sorted_chars(title_norm),
+        })
 
     return files
 
 
+def _iter_audio_files(directory: str):
+    """Recursively yield (path, filename) for audio files under a directory."""
+    try:
+        entries = os.scandir(directory)
+    except OSError:
+        return  # Unreadable directory - skip it like os.walk does
+
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_audio_files(entry.path)
+            elif entry.is_file():
+                name = entry.name
+                dot = name.rfind(".")
+                if dot > 0 and name[dot:].lower() in AUDIO_EXTENSIONS:
+                    yield entry.path, name
+
+
 def parse_filename(filename: str) -> dict:
     """
     Parse artist and title from filename.
@@ -50,7 +80,7 @@ def parse_filename(filename: str) -> dict:
     name = Path(filename).stem
 
     # Remove track numbers at start
-    name = re.sub(r"^\d+[\.\-_\s]+", "", name)
+    name = _TRACK_NUMBER_RE.sub("", name)
 
     # Try common separators
     for sep in [" - ", " _ ", "_-_", " – ", " — "]:
@@ -68,18 +98,81 @@ def normalize_string(s: str) -> str:
         return ""
     # Lowercase, remove special chars, normalize whitespace
     s = s.lower()
-    s = re.sub(r"[^\w\s]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
+    s = _NON_WORD_RE.sub(" ", s)
+    s = _WHITESPACE_RE.sub(" ", s).strip()
     # Remove common suffixes
-    s = re.sub(r"\s*(original mix|extended mix|radio edit|remix|remaster(ed)?)\s*$", "", s, flags=re.I)
+    s = _SUFFIX_RE.sub("", s)
     return s
 
 
+def _sorted_chars(s: str) -> np.ndarray:
+    """Sorted int32 code points of a string, for the packed bound kernel."""
+    return np.sort(np.array([ord(c) for c in s], dtype=np.int32))
+
+
+def build_title_index(files: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pack every file's title code points into one flat array.
+
+    Returns (chars, offsets): file i's are chars[offsets[i]:offsets[i + 1]].
+    """
+    arrays = [file["title_chars"] for file in files]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum([len(a) for a in arrays], out=offsets[1:])
+    chars = np.concatenate(arrays) if arrays else np.empty(0, dtype=np.int32)
+    return chars, offsets
+
+
+@njit(cache=True)
+def _ratio_upper_bounds(query, chars, offsets):
+    """
+    Upper bound on similarity_norm of one title against every packed file.
+
+    fuzz.ratio is 2 * LCS / (len_a + len_b), and the longest common
+    subsequence can't be longer than the characters the two strings share
+    (counted with repeats), so the bound never rejects a pair the full
+    comparison would accept.
+    """
+    n_query = len(query)
+    out = np.empty(len(offsets) - 1, dtype=np.float64)
+    for k in range(len(out)):
+        lo = offsets[k]
+        hi = offsets[k + 1]
+        total = n_query + (hi - lo)
+        if total == 0:
+            out[k] = 1.0
+            continue
+        # Two-pointer merge of the sorted arrays counts shared characters
+        i = 0
+        j = lo
+        common = 0
+        while i < n_query and j < hi:
+            if query[i] == chars[j]:
+                common += 1
+                i += 1
+                j += 1
+            elif query[i] < chars[j]:
+                i += 1
+            else:
+                j += 1
+        out[k] = 2.0 * common / total
+    return out
+
+
+def _min_title_score(threshold: float) -> float:
+    """Lowest title similarity that can still reach threshold overall."""
+    # Best case is a perfect artist match (60/40) or the 0.8 no-artist score
+    return min((threshold - 0.4) / 0.6, threshold / 0.8)
+
+
 def similarity(a: str, b: str) -> float:
     """Calculate string similarity (0-1)."""
-    a_norm = normalize_string(a)
-    b_norm = normalize_string(b)
-    return SequenceMatcher(None, a_norm, b_norm).ratio()
+    return similarity_norm(normalize_string(a), normalize_string(b))
+
+
+def similarity_norm(a_norm: str, b_norm: str) -> float:
+    """Calculate similarity (0-1) of two already-normalized strings."""
+    return fuzz.ratio(a_norm, b_norm) / 100.0
 
 
 def match_track_to_file(
@@ -87,22 +180,38 @@ def match_track_to_file(
     track_artist: str,
     files: list[dict],
     threshold: float = 0.7,
+    title_index: Optional[tuple[np.ndarray, np.ndarray]] = None,
 ) -> Optional[dict]:
     """
     Find best matching local file for a Spotify track.
 
+    files: as returned by scan_music_directory
+    title_index: build_title_index(files), to reuse across many tracks
     Returns best match dict with 'path' and 'score', or None.
     """
     best_match = None
     best_score = 0
 
-    for file in files:
+    # Normalize the track once, not once per file
+    name_norm = normalize_string(track_name)
+    artist_norm = normalize_string(track_artist)
+
+    # Cheap bound on the title score against every file before the
+    # expensive string comparison; the small slack covers float rounding
+    if title_index is None:
+        title_index = build_title_index(files)
+    bounds = _ratio_upper_bounds(_sorted_chars(name_norm), *title_index)
+    candidates = np.flatnonzero(bounds >= _min_title_score(threshold) - 1e-9)
+
+    for idx in candidates:
+        file = files[idx]
+
         # Compare title
-        title_score = similarity(track_name, file["title_guess"] or file["filename"])
+        title_score = similarity_norm(name_norm, file["title_norm"])
 
         # Compare artist if available
         if file["artist_guess"] and track_artist:
-            artist_score = similarity(track_artist, file["artist_guess"])
+            artist_score = similarity_norm(artist_norm, file["artist_norm"])
             # Weight: 60% title, 40% artist
             score = (title_score * 0.6) + (artist_score * 0.4)
         else:
@@ -115,10 +224,16 @@ def match_track_to_file(
     return best_match
 
 
-def match_library(music_dir: str | Path, threshold: float = 0.7) -> dict:
+def match_library(
+    music_dir: str | Path,
+    threshold: float = 0.7,
+    result_sink: Optional[Callable[[dict], None]] = None,
+) -> dict:
     """
     Match all Spotify tracks in database to local files.
 
+    result_sink: called with each match record instead of collecting them
+    in results["matches"], so memory stays flat on large libraries
     Returns summary of matches.
     """
     print(f"Scanning: {music_dir}")
@@ -138,23 +253,23 @@ def match_library(music_dir: str | Path, threshold: float = 0.7) -> dict:
         "unmatched": 0,
         "matches": [],
     }
+    if result_sink is None:
+        result_sink = results["matches"].append
 
     print(f"Matching {len(tracks)} Spotify tracks...")
 
+    # Match without holding a transaction open, then write every match at once
+    updates = []
+    title_index = build_title_index(files)
     for track in tracks:
         track_id, name, artist = track
 
-        match = match_track_to_file(name, artist, files, threshold)
+        match = match_track_to_file(name, artist, files, threshold, title_index)
 
         if match:
-            # Save match to database
-            with get_db() as conn:
-                conn.execute(
-                    "UPDATE tracks SET local_path = ? WHERE id = ?",
-                    (match["path"], track_id)
-                )
+            updates.append((match["path"], track_id))
             results["matched"] += 1
-            results["matches"].append({
+            result_sink({
                 "track": f"{artist} - {name}",
                 "file": match["filename"],
                 "score": match["score"],
@@ -162,6 +277,10 @@ def match_library(music_dir: str | Path, threshold: float = 0.7) -> dict:
         else:
             results["unmatched"] += 1
 
+    if updates:
+        with get_db() as conn:
+            conn.executemany("UPDATE tracks SET local_path = ? WHERE id = ?", updates)
+
     return results
 
 
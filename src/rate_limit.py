@@ -0,0 +1,115 @@
+"""
+Client-side rate limiting for the web APIs this app calls.
+
+Spotify (and GetSongBPM) answer bursts with 429s; keeping every call to
+an API under one shared bucket avoids them instead of backing off after
+the fact.
+"""
+
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class LeakyBucket:
+    """
+    Allow at most `rate` calls per `per` seconds, `concurrent` at a time.
+
+    Use as a context manager around each call; entering blocks until the
+    call may proceed. Safe to share between threads.
+    """
+
+    def __init__(self, rate: int, per: float = 1.0, concurrent: int = 2):
+        self._slots = threading.BoundedSemaphore(concurrent)
+        self._lock = threading.Lock()
+        self._rate = rate
+        self._per = per
+        self._tokens = float(rate)
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+
+    def acquire(self) -> None:
+        self._slots.acquire()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self._rate, self._tokens + (now - self._last) * self._rate / self._per
+                )
+                self._last = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(
+                    self._paused_until - now,
+                    (1 - self._tokens) * self._per / self._rate,
+                )
+            time.sleep(wait)
+
+    def release(self) -> None:
+        self._slots.release()
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for `seconds` (e.g. a 429's Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def __enter__(self) -> "LeakyBucket":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class RateLimitedSession(requests.Session):
+    """
+    requests.Session that sends every request through a LeakyBucket.
+
+    A 429 pauses the whole bucket for the response's Retry-After and the
+    request is retried, up to max_retries times. Other transient errors
+    (5xx) are retried by the mounted adapter, as spotipy's own session does.
+    """
+
+    def __init__(self, bucket: LeakyBucket, max_retries: int = 3):
+        super().__init__()
+        self.bucket = bucket
+        self.max_retries = max_retries
+        adapter = HTTPAdapter(max_retries=Retry(
+            total=3,
+            connect=None,
+            read=False,
+            allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
+            status=3,
+            backoff_factor=0.3,
+            status_forcelist=[500, 502, 503, 504],
+        ))
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def request(self, *args, **kwargs) -> requests.Response:
+        for attempt in range(self.max_retries + 1):
+            with self.bucket:
+                response = super().request(*args, **kwargs)
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+            self.bucket.pause(_retry_after(response))
+        return response
+
+
+def _retry_after(response: requests.Response, default: float = 1.0) -> float:
+    """Seconds to wait according to a 429 response's Retry-After header."""
+    value: Optional[str] = response.headers.get("Retry-After")
+    try:
+        return max(float(value), 0.0) if value is not None else default
+    except ValueError:
+        return default
+
+
+# Shared by every Spotify API call in the process: 10 requests per second,
+# no more than 2 in flight
+SPOTIFY_LIMITER = LeakyBucket(rate=10, per=1.0, concurrent=2)
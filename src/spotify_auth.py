@@ -1,8 +1,11 @@
 import os
+from functools import lru_cache
 from pathlib import Path
 import spotipy
+from spotipy.cache_handler import CacheFileHandler
 from spotipy.oauth2 import SpotifyOAuth
 from dotenv import load_dotenv
+from rate_limit import SPOTIFY_LIMITER, RateLimitedSession
 
 load_dotenv()
 
@@ -19,17 +22,50 @@ SCOPES = [
 CACHE_PATH = Path(__file__).parent.parent / ".spotify_cache"
 
 
+class _MemoryCacheFileHandler(CacheFileHandler):
+    """
+    Token cache file with an in-memory copy.
+
+    spotipy looks up the cached token before every API call; this reads
+    the file once and afterwards serves the token from memory. Refreshed
+    tokens are still written through to the file for the next process.
+    """
+
+    def __init__(self, cache_path: str):
+        super().__init__(cache_path=cache_path)
+        self._token_info = None
+
+    def get_cached_token(self):
+        if self._token_info is None:
+            self._token_info = super().get_cached_token()
+        return self._token_info
+
+    def save_token_to_cache(self, token_info):
+        self._token_info = token_info
+        super().save_token_to_cache(token_info)
+
+
+@lru_cache(maxsize=1)
 def get_spotify_client() -> spotipy.Spotify:
-    """Get authenticated Spotify client with token refresh handling."""
+    """
+    Get authenticated Spotify client with token refresh handling.
+
+    The client (and its auth manager's token cache) is built once and
+    shared by every caller. The access token is refreshed only when it
+    is about to expire. Every API call goes through SPOTIFY_LIMITER.
+    """
     auth_manager = SpotifyOAuth(
         client_id=os.getenv("SPOTIFY_CLIENT_ID"),
         client_secret=os.getenv("SPOTIFY_CLIENT_SECRET"),
         redirect_uri=os.getenv("SPOTIFY_REDIRECT_URI", "http://localhost:8888/callback"),
         scope=" ".join(SCOPES),
-        cache_path=str(CACHE_PATH),
+        cache_handler=_MemoryCacheFileHandler(str(CACHE_PATH)),
         open_browser=True,
     )
-    return spotipy.Spotify(auth_manager=auth_manager)
+    return spotipy.Spotify(
+        auth_manager=auth_manager,
+        requests_session=RateLimitedSession(SPOTIFY_LIMITER),
+    )
 
 
 def test_connection() -> dict:
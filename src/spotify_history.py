@@ -1,26 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Iterator
 from spotify_auth import get_spotify_client
 
 
+def _track_dict(track: dict, **extra) -> dict:
+    """Flatten a Spotify track object into our track dict, plus extra fields."""
+    # join() builds a list from a generator anyway; a list comp skips that step
+    return {
+        "id": track["id"],
+        "name": track["name"],
+        "artist": ", ".join([a["name"] for a in track["artists"]]),
+        "album": track["album"]["name"],
+        "duration_ms": track["duration_ms"],
+        "uri": track["uri"],
+        **extra,
+    }
+
+
 def get_recently_played(limit: int = 50) -> list[dict]:
     """Fetch recently played tracks (max 50 per Spotify API limit)."""
     sp = get_spotify_client()
     results = sp.current_user_recently_played(limit=limit)
 
-    tracks = []
-    for item in results["items"]:
-        track = item["track"]
-        tracks.append({
-            "id": track["id"],
-            "name": track["name"],
-            "artist": ", ".join(a["name"] for a in track["artists"]),
-            "album": track["album"]["name"],
-            "duration_ms": track["duration_ms"],
-            "played_at": item["played_at"],
-            "uri": track["uri"],
-        })
-    return tracks
+    return [
+        _track_dict(item["track"], played_at=item["played_at"])
+        for item in results["items"]
+    ]
 
 
 def get_top_tracks(time_range: str = "medium_term", limit: int = 50) -> list[dict]:
@@ -32,20 +38,15 @@ def get_top_tracks(time_range: str = "medium_term", limit: int = 50) -> list[dic
     sp = get_spotify_client()
     results = sp.current_user_top_tracks(limit=limit, time_range=time_range)
 
-    tracks = []
-    for i, track in enumerate(results["items"]):
-        tracks.append({
-            "id": track["id"],
-            "name": track["name"],
-            "artist": ", ".join(a["name"] for a in track["artists"]),
-            "album": track["album"]["name"],
-            "duration_ms": track["duration_ms"],
-            "popularity": track["popularity"],
-            "rank": i + 1,
-            "time_range": time_range,
-            "uri": track["uri"],
-        })
-    return tracks
+    return [
+        _track_dict(
+            track,
+            popularity=track["popularity"],
+            rank=i + 1,
+            time_range=time_range,
+        )
+        for i, track in enumerate(results["items"])
+    ]
 
 
 # NOTE: Spotify deprecated audio features API for new apps (Nov 2024)
@@ -53,37 +54,50 @@ def get_top_tracks(time_range: str = "medium_term", limit: int = 50) -> list[dic
 # actually better for DJ use since we can do deeper mixing analysis
 
 
-def get_saved_tracks(limit: int = None) -> Iterator[dict]:
-    """Fetch all saved/liked tracks (paginated)."""
+def _saved_track(item: dict) -> dict:
+    """Flatten one saved-tracks API item."""
+    return _track_dict(item["track"], added_at=item["added_at"])
+
+
+def get_saved_tracks(limit: int = None, max_workers: int = 5) -> Iterator[dict]:
+    """
+    Fetch all saved/liked tracks (paginated).
+
+    The first page tells us the total; the remaining pages are then
+    fetched concurrently (max_workers at a time) and yielded in order.
+    """
     sp = get_spotify_client()
-    offset = 0
     batch_size = 50
     count = 0
 
-    while True:
-        results = sp.current_user_saved_tracks(limit=batch_size, offset=offset)
-
-        if not results["items"]:
-            break
-
-        for item in results["items"]:
-            track = item["track"]
-            yield {
-                "id": track["id"],
-                "name": track["name"],
-                "artist": ", ".join(a["name"] for a in track["artists"]),
-                "album": track["album"]["name"],
-                "duration_ms": track["duration_ms"],
-                "added_at": item["added_at"],
-                "uri": track["uri"],
-            }
-            count += 1
-            if limit and count >= limit:
-                return
-
-        offset += batch_size
-        if not results["next"]:
-            break
+    first = sp.current_user_saved_tracks(limit=batch_size, offset=0)
+    for item in first["items"]:
+        yield _saved_track(item)
+        count += 1
+        if limit and count >= limit:
+            return
+
+    if not first["items"] or not first["next"]:
+        return
+
+    total = min(first["total"], limit) if limit else first["total"]
+    offsets = range(batch_size, total, batch_size)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        pages = executor.map(
+            lambda offset: sp.current_user_saved_tracks(limit=batch_size, offset=offset),
+            offsets,
+        )
+        for page in pages:
+            for item in page["items"]:
+                yield _saved_track(item)
+                count += 1
+                if limit and count >= limit:
+                    return
+    finally:
+        # Don't wait on pages nobody will read if the caller stops early
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 if __name__ == "__main__":
@@ -1,11 +1,31 @@
+import json
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional
+from functools import lru_cache
+from typing import Callable, Optional
 from spotify_auth import get_spotify_client
-from database import get_db
+from database import get_db, init_db
+from vibe_classifier import DJ_CATEGORIES
 
+# DJ folders are built this many at a time; the Spotify calls inside them
+# are throttled by the client's shared rate limiter
+FOLDER_WORKERS = 4
 
+# DJ folder names in category display order
+_CATEGORY_FOLDER_NAMES = tuple(name for names in DJ_CATEGORIES.values() for name in names)
+
+# Names of playlists this app creates (smart playlists and DJ folders)
+_CREATED_NAME_RE = re.compile(
+    r"Top 50|Top 30|Most Played|Recently Played"
+    r"|Morning|Afternoon|Evening|Late Night|DJ \|"
+)
+
+
+@lru_cache(maxsize=1)
 def get_user_id() -> str:
-    """Get current user's Spotify ID."""
+    """Get current user's Spotify ID (fetched once, it never changes)."""
     sp = get_spotify_client()
     return sp.current_user()["id"]
 
@@ -59,8 +79,9 @@ def create_playlist_from_track_ids(
     public: bool = False,
 ) -> dict:
     """Create playlist from database track IDs."""
-    # Convert IDs to URIs
-    track_uris = [f"spotify:track:{tid}" for tid in track_ids]
+    # Convert IDs to URIs (plain concatenation, no format parsing)
+    prefix = "spotify:track:"
+    track_uris = [prefix + tid for tid in track_ids]
 
     playlist = create_playlist(name, description, public)
     added = add_tracks_to_playlist(playlist["id"], track_uris)
@@ -105,10 +126,13 @@ def create_recently_played_playlist(
 ) -> dict:
     """Create playlist from recently played tracks (unique)."""
     with get_db() as conn:
+        # Each track's latest play; the (track_id, played_at) unique index
+        # covers the GROUP BY
         rows = conn.execute("""
-            SELECT DISTINCT track_id
+            SELECT track_id, MAX(played_at) AS last_played
             FROM plays
-            ORDER BY played_at DESC
+            GROUP BY track_id
+            ORDER BY last_played DESC
             LIMIT ?
         """, (limit,)).fetchall()
 
@@ -159,28 +183,19 @@ def create_time_based_playlist(
 
     hour_start/hour_end: 0-23 (e.g., 22, 4 for late night)
     """
+    # Hours in the window, handling wrap-around (e.g., 22:00 to 04:00)
+    hours = [(hour_start + i) % 24 for i in range((hour_end - hour_start) % 24)]
+    placeholders = ", ".join("?" * len(hours))
+
     with get_db() as conn:
-        # Handle wrap-around (e.g., 22:00 to 04:00)
-        if hour_start <= hour_end:
-            rows = conn.execute("""
-                SELECT track_id, COUNT(*) as cnt
-                FROM plays
-                WHERE CAST(strftime('%H', played_at) AS INTEGER) >= ?
-                  AND CAST(strftime('%H', played_at) AS INTEGER) < ?
-                GROUP BY track_id
-                ORDER BY cnt DESC
-                LIMIT ?
-            """, (hour_start, hour_end, limit)).fetchall()
-        else:
-            rows = conn.execute("""
-                SELECT track_id, COUNT(*) as cnt
-                FROM plays
-                WHERE CAST(strftime('%H', played_at) AS INTEGER) >= ?
-                   OR CAST(strftime('%H', played_at) AS INTEGER) < ?
-                GROUP BY track_id
-                ORDER BY cnt DESC
-                LIMIT ?
-            """, (hour_start, hour_end, limit)).fetchall()
+        rows = conn.execute(f"""
+            SELECT track_id, COUNT(*) as cnt
+            FROM plays
+            WHERE hour_of_day IN ({placeholders})
+            GROUP BY track_id
+            ORDER BY cnt DESC
+            LIMIT ?
+        """, (*hours, limit)).fetchall()
 
     track_ids = [row[0] for row in rows]
 
@@ -234,17 +249,24 @@ def create_all_smart_playlists(public: bool = False) -> list[dict]:
     return results
 
 
-def create_dj_folder_playlist(
-    folder_name: str,
-    bpm_min: float = 0,
-    bpm_max: float = 300,
-    limit: int = 50,
-    public: bool = False,
-) -> dict:
+_FOLDER_TRACKS_SQL = """
+    SELECT t.id, af.bpm, COALESCE(ts.play_count, 0) AS play_count
+    FROM tracks t
+    JOIN track_vibes tv ON t.id = tv.track_id
+    JOIN vibes v ON tv.vibe_id = v.id
+    JOIN audio_features af ON t.id = af.track_id
+    LEFT JOIN track_stats ts ON t.id = ts.track_id
+    WHERE v.name = ? AND af.bpm IS NOT NULL
+    ORDER BY COALESCE(ts.play_count, 0) DESC, tv.confidence DESC
+"""
+
+
+def _fetch_folder_tracks(folder_name: str) -> tuple[str, list]:
     """
-    Create a Spotify playlist for a specific DJ folder.
+    Get a DJ folder's description and its analyzed tracks.
 
-    Tracks are ordered by play count (most played first).
+    Rows have id, bpm and play_count, most played first.
+    Raises ValueError if the folder doesn't exist.
     """
     with get_db() as conn:
         # Get folder description
@@ -255,34 +277,129 @@ def create_dj_folder_playlist(
         if not folder:
             raise ValueError(f"DJ folder not found: {folder_name}")
 
-        # Get tracks in this folder, filtered by BPM
-        rows = conn.execute("""
-            SELECT t.id
-            FROM tracks t
-            JOIN track_vibes tv ON t.id = tv.track_id
-            JOIN vibes v ON tv.vibe_id = v.id
-            JOIN audio_features af ON t.id = af.track_id
-            LEFT JOIN track_stats ts ON t.id = ts.track_id
-            WHERE v.name = ?
-              AND af.bpm >= ? AND af.bpm <= ?
-            ORDER BY COALESCE(ts.play_count, 0) DESC, tv.confidence DESC
-            LIMIT ?
-        """, (folder_name, bpm_min, bpm_max, limit)).fetchall()
+        rows = conn.execute(_FOLDER_TRACKS_SQL, (folder_name,)).fetchall()
 
-    track_ids = [row[0] for row in rows]
+    return folder["description"], rows
 
-    if not track_ids:
-        raise ValueError(f"No tracks found in folder: {folder_name}")
 
+def _create_folder_playlist(
+    folder_name: str,
+    description: str,
+    track_ids: list[str],
+    bpm_min: float,
+    bpm_max: float,
+    public: bool,
+) -> dict:
+    """Create the Spotify playlist for (a BPM range of) a DJ folder."""
     # Create playlist name with BPM range if filtered
     if bpm_min > 0 or bpm_max < 300:
         name = f"DJ | {folder_name} | {bpm_min:.0f}-{bpm_max:.0f} BPM"
     else:
         name = f"DJ | {folder_name}"
 
-    description = f"{folder['description'][:200]}"
+    return create_playlist_from_track_ids(name, track_ids, description[:200], public)
 
-    return create_playlist_from_track_ids(name, track_ids, description, public)
+
+def create_dj_folder_playlist(
+    folder_name: str,
+    bpm_min: float = 0,
+    bpm_max: float = 300,
+    limit: int = 50,
+    public: bool = False,
+) -> dict:
+    """
+    Create a Spotify playlist for a specific DJ folder.
+
+    Tracks are ordered by play count (most played first).
+    """
+    description, track_ids = _fetch_folder_track_ids(folder_name, bpm_min, bpm_max, limit)
+
+    return _create_folder_playlist(
+        folder_name, description, track_ids, bpm_min, bpm_max, public
+    )
+
+
+def _fetch_folder_track_ids(
+    folder_name: str,
+    bpm_min: float = 0,
+    bpm_max: float = 300,
+    limit: int = 50,
+) -> tuple[str, list[str]]:
+    """
+    Get a DJ folder's description and up to limit track IDs in a BPM range.
+
+    Raises ValueError if the folder doesn't exist or has no such tracks.
+    """
+    description, rows = _fetch_folder_tracks(folder_name)
+
+    # Filter by BPM
+    track_ids = [row["id"] for row in rows if bpm_min <= row["bpm"] <= bpm_max][:limit]
+
+    if not track_ids:
+        raise ValueError(f"No tracks found in folder: {folder_name}")
+
+    return description, track_ids
+
+
+def _create_folder_playlist_if_enough(
+    folder_name: str,
+    min_tracks: int,
+    public: bool,
+) -> tuple[Optional[dict], int]:
+    """
+    Create a folder's playlist only if it has at least min_tracks tracks.
+
+    Returns (playlist or None, number of tracks found).
+    """
+    description, track_ids = _fetch_folder_track_ids(folder_name)
+    if len(track_ids) < min_tracks:
+        return None, len(track_ids)
+
+    playlist = _create_folder_playlist(folder_name, description, track_ids, 0, 300, public)
+    return playlist, len(track_ids)
+
+
+_FOLDER_BUCKET_COUNTS_SQL = """
+    SELECT v.name, CAST(af.bpm / ? AS INT) AS bucket, COUNT(*) AS track_count
+    FROM track_vibes tv
+    JOIN vibes v ON tv.vibe_id = v.id
+    JOIN audio_features af ON tv.track_id = af.track_id
+    WHERE v.name IN (SELECT value FROM json_each(?)) AND af.bpm IS NOT NULL
+    GROUP BY v.name, bucket
+    HAVING COUNT(*) >= ?
+"""
+
+
+def _folders_with_full_buckets(
+    folder_names: list[str],
+    bpm_bucket_size: int,
+    min_tracks: int,
+) -> set[str]:
+    """Names of folders with at least one BPM bucket of min_tracks tracks."""
+    # Names are bound as one JSON array, so the statement text never changes
+    # and stays in the connection's statement cache
+    with get_db() as conn:
+        rows = conn.execute(
+            _FOLDER_BUCKET_COUNTS_SQL,
+            (bpm_bucket_size, json.dumps(list(folder_names)), min_tracks),
+        ).fetchall()
+    return {row["name"] for row in rows}
+
+
+def _map_folders(fn: Callable[[str], object], folder_names: list[str]) -> list[tuple]:
+    """
+    Run fn on each folder concurrently.
+
+    Returns (result, error) pairs in the order of folder_names.
+    """
+    def run(folder_name):
+        try:
+            return fn(folder_name), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=FOLDER_WORKERS) as executor:
+        return list(executor.map(run, folder_names))
 
 
 def create_all_dj_folder_playlists(
@@ -294,35 +411,30 @@ def create_all_dj_folder_playlists(
 
     Only creates playlists for folders with at least min_tracks.
     """
-    from vibe_classifier import DJ_FOLDERS
-
     results = []
 
-    # Group folders by category for nicer output
-    categories = {
-        "SET POSITION": ["Openers", "Builders", "Peak Time", "Weapons", "Closers"],
-        "TEXTURE": ["Organic", "Synthetic", "Gritty"],
-        "RHYTHM": ["4x4 Locked", "Broken Beat", "Halftime / Slow", "Fast & Chaotic"],
-        "EMOTIONAL": ["Melancholic", "Euphoric", "Hypnotic", "Aggressive"],
-        "FUNCTIONAL": ["Transitions", "Curveballs"],
-    }
+    # Build every folder concurrently, then report in category order
+    outcomes = dict(zip(_CATEGORY_FOLDER_NAMES, _map_folders(
+        lambda folder_name: _create_folder_playlist_if_enough(folder_name, min_tracks, public),
+        _CATEGORY_FOLDER_NAMES,
+    )))
 
-    for category, folder_names in categories.items():
+    for category, folder_names in DJ_CATEGORIES.items():
         print(f"\n  {category}")
         print("  " + "-" * 40)
 
         for folder_name in folder_names:
-            try:
-                result = create_dj_folder_playlist(folder_name, public=public)
-                if result["tracks_added"] >= min_tracks:
-                    results.append({"category": category, **result})
-                    print(f"    {folder_name:20} | {result['tracks_added']:3} tracks")
-                else:
-                    print(f"    {folder_name:20} | skipped ({result['tracks_added']} tracks)")
-            except ValueError as e:
+            built, error = outcomes[folder_name]
+            if isinstance(error, ValueError):
                 print(f"    {folder_name:20} | skipped (no tracks)")
-            except Exception as e:
-                print(f"    {folder_name:20} | error: {e}")
+            elif error is not None:
+                print(f"    {folder_name:20} | error: {error}")
+            elif built[0] is not None:
+                result = built[0]
+                results.append({"category": category, **result})
+                print(f"    {folder_name:20} | {result['tracks_added']:3} tracks")
+            else:
+                print(f"    {folder_name:20} | skipped ({built[1]} tracks)")
 
     return results
 
@@ -332,6 +444,8 @@ def create_dj_folder_with_bpm_splits(
     bpm_bucket_size: int = 5,
     min_tracks: int = 3,
     public: bool = False,
+    log: Callable[[str], None] = print,
+    limit: int = 50,
 ) -> list[dict]:
     """
     Create multiple playlists for a DJ folder, split by BPM ranges.
@@ -339,31 +453,45 @@ def create_dj_folder_with_bpm_splits(
     E.g., "Peak Time" becomes:
     - DJ | Peak Time | 122-127 BPM
     - DJ | Peak Time | 127-132 BPM
+
+    Progress lines go to log (default: print).
     """
-    from vibe_classifier import get_bpm_buckets_for_folder
+    # One query for the whole folder, split into BPM buckets here
+    try:
+        description, rows = _fetch_folder_tracks(folder_name)
+    except ValueError:
+        return []
+
+    buckets = defaultdict(list)
+    bucket_plays = defaultdict(int)
+    for row in rows:
+        bucket = int(row["bpm"] // bpm_bucket_size) * bpm_bucket_size
+        buckets[bucket].append(row["id"])
+        bucket_plays[bucket] += row["play_count"]
 
-    buckets = get_bpm_buckets_for_folder(folder_name, bpm_bucket_size)
     results = []
 
-    for bucket in buckets:
-        if bucket["track_count"] < min_tracks:
+    # Most played buckets first
+    for bucket in sorted(buckets, key=bucket_plays.get, reverse=True):
+        track_ids = buckets[bucket]
+        if len(track_ids) < min_tracks:
             continue
 
-        # Parse BPM range from bucket
-        bpm_range = bucket["bpm_range"]
-        bpm_min, bpm_max = map(float, bpm_range.split("-"))
+        bpm_range = f"{bucket}-{bucket + bpm_bucket_size}"
 
         try:
-            result = create_dj_folder_playlist(
+            result = _create_folder_playlist(
                 folder_name,
-                bpm_min=bpm_min,
-                bpm_max=bpm_max,
+                description,
+                track_ids[:limit],
+                bpm_min=bucket,
+                bpm_max=bucket + bpm_bucket_size,
                 public=public,
             )
             results.append(result)
-            print(f"  Created: {result['name']} ({result['tracks_added']} tracks)")
+            log(f"  Created: {result['name']} ({result['tracks_added']} tracks)")
         except Exception as e:
-            print(f"  Skipped {folder_name} {bpm_range}: {e}")
+            log(f"  Skipped {folder_name} {bpm_range}: {e}")
 
     return results
 
@@ -379,8 +507,6 @@ def create_full_dj_library(
 
     If split_by_bpm is True, creates sub-playlists per BPM range within each folder.
     """
-    from vibe_classifier import DJ_FOLDERS
-
     results = {
         "folders_created": 0,
         "playlists_created": 0,
@@ -388,36 +514,55 @@ def create_full_dj_library(
         "playlists": [],
     }
 
-    categories = {
-        "SET POSITION": ["Openers", "Builders", "Peak Time", "Weapons", "Closers"],
-        "TEXTURE": ["Organic", "Synthetic", "Gritty"],
-        "RHYTHM": ["4x4 Locked", "Broken Beat", "Halftime / Slow", "Fast & Chaotic"],
-        "EMOTIONAL": ["Melancholic", "Euphoric", "Hypnotic", "Aggressive"],
-        "FUNCTIONAL": ["Transitions", "Curveballs"],
-    }
-
-    for category, folder_names in categories.items():
+    def build_folder(folder_name: str) -> tuple[list[dict], list[str]]:
+        """Create one folder's playlists, collecting its output lines."""
+        lines = []
+        if split_by_bpm:
+            playlists = create_dj_folder_with_bpm_splits(
+                folder_name,
+                bpm_bucket_size=bpm_bucket_size,
+                min_tracks=min_tracks,
+                public=public,
+                log=lines.append,
+            )
+        else:
+            try:
+                playlist, _ = _create_folder_playlist_if_enough(folder_name, min_tracks, public)
+                playlists = [playlist] if playlist else []
+                if playlist:
+                    lines.append(f"  Created: {playlist['name']} ({playlist['tracks_added']} tracks)")
+            except Exception as e:
+                playlists = []
+                lines.append(f"  Skipped {folder_name}: {e}")
+        return playlists, lines
+
+    # One counting query up front: folders without a single full BPM
+    # bucket would create nothing, so they're not built at all
+    folder_names_to_build = _CATEGORY_FOLDER_NAMES
+    if split_by_bpm:
+        full = _folders_with_full_buckets(_CATEGORY_FOLDER_NAMES, bpm_bucket_size, min_tracks)
+        folder_names_to_build = [name for name in _CATEGORY_FOLDER_NAMES if name in full]
+
+    # Build every folder concurrently, then report in category order
+    outcomes = dict(zip(
+        folder_names_to_build, _map_folders(build_folder, folder_names_to_build)
+    ))
+
+    for category, folder_names in DJ_CATEGORIES.items():
         print(f"\n{'='*50}")
         print(f"  {category}")
         print(f"{'='*50}")
 
         for folder_name in folder_names:
-            if split_by_bpm:
-                playlists = create_dj_folder_with_bpm_splits(
-                    folder_name,
-                    bpm_bucket_size=bpm_bucket_size,
-                    min_tracks=min_tracks,
-                    public=public,
-                )
-            else:
-                try:
-                    playlist = create_dj_folder_playlist(folder_name, public=public)
-                    playlists = [playlist] if playlist["tracks_added"] >= min_tracks else []
-                    if playlists:
-                        print(f"  Created: {playlist['name']} ({playlist['tracks_added']} tracks)")
-                except Exception as e:
-                    playlists = []
-                    print(f"  Skipped {folder_name}: {e}")
+            if folder_name not in outcomes:
+                continue
+            built, error = outcomes[folder_name]
+            if error is not None:
+                print(f"  Skipped {folder_name}: {error}")
+                continue
+            playlists, lines = built
+            for line in lines:
+                print(line)
 
             if playlists:
                 results["folders_created"] += 1
@@ -429,21 +574,27 @@ def create_full_dj_library(
 
 
 def list_created_playlists() -> list[dict]:
-    """List playlists created by this app (by naming pattern)."""
+    """List playlists created by this app (by naming pattern), across all pages."""
     sp = get_spotify_client()
     user_id = get_user_id()
 
-    playlists = []
-    results = sp.current_user_playlists(limit=50)
-
-    # Include DJ folder playlists
-    patterns = ["Top 50", "Top 30", "Most Played", "Recently Played",
-                "Morning", "Afternoon", "Evening", "Late Night",
-                "DJ |"]
+    # First page gives the total; fetch the rest concurrently
+    first = sp.current_user_playlists(limit=50, offset=0)
+    items = list(first["items"])
+    if first["next"]:
+        offsets = range(50, first["total"], 50)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            pages = executor.map(
+                lambda offset: sp.current_user_playlists(limit=50, offset=offset),
+                offsets,
+            )
+            for page in pages:
+                items.extend(page["items"])
 
-    for item in results["items"]:
+    playlists = []
+    for item in items:
         if item["owner"]["id"] == user_id:
-            if any(p in item["name"] for p in patterns):
+            if _CREATED_NAME_RE.search(item["name"]):
                 playlists.append({
                     "id": item["id"],
                     "name": item["name"],
@@ -457,7 +608,6 @@ def list_created_playlists() -> list[dict]:
 
 if __name__ == "__main__":
     import sys
-    from database import init_db
 
     init_db()
 
@@ -1,43 +1,85 @@
+import asyncio
 from datetime import datetime
+import spotify_history
 from spotify_history import get_recently_played, get_top_tracks, get_saved_tracks
-from database import init_db, upsert_track, record_play, save_top_tracks, get_stats
+from database import (
+    get_db, init_db, upsert_tracks_bulk, record_plays_bulk, save_top_tracks, get_stats,
+)
+
+# Saved tracks are written in batches of this many rows
+SAVED_TRACKS_BATCH_SIZE = 500
 
 
 def sync_recently_played() -> int:
     """Sync recently played tracks to database."""
     tracks = get_recently_played(limit=50)
-    count = 0
 
-    for track in tracks:
-        upsert_track(track)
-        record_play(track["id"], track["played_at"])
-        count += 1
+    # Tracks and their plays in one transaction
+    with get_db():
+        upsert_tracks_bulk(tracks)
+        record_plays_bulk([(track["id"], track["played_at"]) for track in tracks])
 
-    return count
+    return len(tracks)
 
 
-def sync_top_tracks() -> dict:
-    """Sync top tracks for all time ranges."""
-    counts = {}
+TIME_RANGES = ("short_term", "medium_term", "long_term")
+
+
+async def sync_top_tracks_async(max_concurrency: int = 2) -> dict:
+    """
+    Sync top tracks for all time ranges, fetching them concurrently.
+
+    At most max_concurrency requests are in flight, to stay clear of
+    Spotify's rate limit. Results are saved once all fetches are done.
+    """
+    # Build (and authenticate) the shared client before fanning out, so the
+    # worker threads don't race to create it on a cold cache
+    spotify_history.get_spotify_client()
+    semaphore = asyncio.Semaphore(max_concurrency)
 
-    for time_range in ["short_term", "medium_term", "long_term"]:
-        tracks = get_top_tracks(time_range=time_range, limit=50)
-        save_top_tracks(tracks, time_range)
-        counts[time_range] = len(tracks)
+    async def fetch(time_range: str) -> list[dict]:
+        async with semaphore:
+            return await asyncio.to_thread(get_top_tracks, time_range=time_range, limit=50)
+
+    results = await asyncio.gather(*(fetch(tr) for tr in TIME_RANGES))
+
+    # Every time range in one transaction
+    counts = {}
+    with get_db():
+        for time_range, tracks in zip(TIME_RANGES, results):
+            save_top_tracks(tracks, time_range)
+            counts[time_range] = len(tracks)
 
     return counts
 
 
+def sync_top_tracks() -> dict:
+    """
+    Sync top tracks for all time ranges.
+
+    Runs its own event loop, so it must not be called from inside a running
+    one (asyncio.run raises RuntimeError); await sync_top_tracks_async there.
+    """
+    return asyncio.run(sync_top_tracks_async())
+
+
 def sync_saved_tracks(limit: int = None) -> int:
     """Sync saved/liked tracks to database."""
     count = 0
+    batch = []
 
     for track in get_saved_tracks(limit=limit):
-        upsert_track(track)
+        batch.append(track)
         count += 1
+        if len(batch) >= SAVED_TRACKS_BATCH_SIZE:
+            upsert_tracks_bulk(batch)
+            batch = []
         if count % 100 == 0:
             print(f"  Synced {count} saved tracks...")
 
+    if batch:
+        upsert_tracks_bulk(batch)
+
     return count
 
 
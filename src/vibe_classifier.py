@@ -5,17 +5,22 @@ Inspired by: Four Tet, Skrillex, Boys Noize, Rufus Du Sol,
 Floating Points, Burial, Aphex Twin, Peggy Gou
 """
 
+import heapq
+import sqlite3
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional
+import numpy as np
 from database import get_db
 
 
-@dataclass
+@dataclass(frozen=True)
 class DJFolder:
     """
     Defines a DJ folder based on when/how you'd use the track.
 
-    Not generic "vibes" - actual mixing categories.
+    Not generic "vibes" - actual mixing categories. Frozen: DJ_FOLDERS'
+    ranges and weights are copied into scoring arrays at import.
     """
     name: str
     description: str
@@ -199,40 +204,84 @@ DJ_FOLDERS = [
     ),
 ]
 
+# DJ_FOLDERS names grouped by category, in display order
+DJ_CATEGORIES = {
+    "SET POSITION": ("Openers", "Builders", "Peak Time", "Weapons", "Closers"),
+    "TEXTURE": ("Organic", "Synthetic", "Gritty"),
+    "RHYTHM": ("4x4 Locked", "Broken Beat", "Halftime / Slow", "Fast & Chaotic"),
+    "EMOTIONAL": ("Melancholic", "Euphoric", "Hypnotic", "Aggressive"),
+    "FUNCTIONAL": ("Transitions", "Curveballs"),
+}
+
+
+def _folder_arrays(folders: list[DJFolder]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Feature ranges and weights of folders as (F, 4) arrays.
+
+    Columns are bpm, energy, valence, danceability. Returns (lo, hi, weights).
+    """
+    lo = np.array([
+        (f.bpm_min, f.energy_min, f.valence_min, f.danceability_min) for f in folders
+    ], dtype=np.float64)
+    hi = np.array([
+        (f.bpm_max, f.energy_max, f.valence_max, f.danceability_max) for f in folders
+    ], dtype=np.float64)
+    weights = np.array([
+        (f.bpm_weight, f.energy_weight, f.valence_weight, f.danceability_weight)
+        for f in folders
+    ], dtype=np.float64)
+    return lo, hi, weights
+
+
+# DJ_FOLDERS as arrays, for scoring many tracks against every folder at once,
+# with the folder names as the parallel index
+_DJ_FOLDER_ARRAYS = _folder_arrays(DJ_FOLDERS)
+_DJ_FOLDER_NAMES = tuple(f.name for f in DJ_FOLDERS)
+
+
+_UPSERT_FOLDER_SQL = """
+    INSERT INTO vibes (name, description, energy_min, energy_max,
+                       valence_min, valence_max, bpm_min, bpm_max)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(name) DO UPDATE SET
+        description = excluded.description,
+        energy_min = excluded.energy_min,
+        energy_max = excluded.energy_max,
+        valence_min = excluded.valence_min,
+        valence_max = excluded.valence_max,
+        bpm_min = excluded.bpm_min,
+        bpm_max = excluded.bpm_max
+"""
+
 
 def init_folders(folders: list[DJFolder] = None):
     """Initialize DJ folder categories in database."""
     folders = folders or DJ_FOLDERS
 
     with get_db() as conn:
-        for folder in folders:
-            conn.execute("""
-                INSERT INTO vibes (name, description, energy_min, energy_max,
-                                   valence_min, valence_max, bpm_min, bpm_max)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT(name) DO UPDATE SET
-                    description = excluded.description,
-                    energy_min = excluded.energy_min,
-                    energy_max = excluded.energy_max,
-                    valence_min = excluded.valence_min,
-                    valence_max = excluded.valence_max,
-                    bpm_min = excluded.bpm_min,
-                    bpm_max = excluded.bpm_max
-            """, (
+        conn.executemany(_UPSERT_FOLDER_SQL, [
+            (
                 folder.name, folder.description,
                 folder.energy_min, folder.energy_max,
                 folder.valence_min, folder.valence_max,
                 folder.bpm_min, folder.bpm_max,
-            ))
+            )
+            for folder in folders
+        ])
 
     print(f"Initialized {len(folders)} DJ folders")
 
 
-def classify_track(track_id: str, folders: list[DJFolder] = None) -> list[tuple[str, float]]:
+def classify_track(
+    track_id: str,
+    folders: list[DJFolder] = None,
+    limit: Optional[int] = None,
+) -> list[tuple[str, float]]:
     """
     Classify a track into DJ folders based on audio features.
 
     Returns list of (folder_name, confidence) tuples, sorted by confidence.
+    With limit, only the best limit matches are returned.
     """
     folders = folders or DJ_FOLDERS
 
@@ -242,19 +291,36 @@ def classify_track(track_id: str, folders: list[DJFolder] = None) -> list[tuple[
             FROM audio_features WHERE track_id = ?
         """, (track_id,)).fetchone()
 
-        if not features:
-            return []
+    if not features:
+        return []
+
+    return _match_folders(*features, folders, limit)
 
-        bpm, energy, valence, danceability = features
+
+def _match_folders(
+    bpm: float,
+    energy: float,
+    valence: float,
+    danceability: float,
+    folders: list[DJFolder],
+    limit: Optional[int] = None,
+) -> list[tuple[str, float]]:
+    """Folders a track's features fit, as (folder_name, confidence), best first."""
+    if folders is DJ_FOLDERS:
+        arrays, names = _DJ_FOLDER_ARRAYS, _DJ_FOLDER_NAMES
+    else:
+        arrays, names = _folder_arrays(folders), [f.name for f in folders]
+    features = np.array([[bpm, energy, valence, danceability]], dtype=np.float64)
+    confidences = _folder_confidences(features, *arrays)[0]
 
     matches = []
-    for folder in folders:
-        confidence = calculate_folder_confidence(
-            bpm, energy, valence, danceability, folder
-        )
+    for name, confidence in zip(names, confidences.tolist()):
         if confidence > 0.3:  # Minimum threshold
-            matches.append((folder.name, confidence))
+            matches.append((name, confidence))
 
+    if limit is not None:
+        # Same order as the full sort (ties keep folder order), without it
+        return heapq.nlargest(limit, matches, key=lambda x: x[1])
     return sorted(matches, key=lambda x: x[1], reverse=True)
 
 
@@ -309,61 +375,151 @@ def calculate_folder_confidence(
     return round(weighted, 3)
 
 
+def _folder_confidences(
+    features: np.ndarray,
+    lo: np.ndarray,
+    hi: np.ndarray,
+    weights: np.ndarray,
+) -> np.ndarray:
+    """
+    Vectorized calculate_folder_confidence.
+
+    features is (T, 4) (bpm, energy, valence, danceability); lo, hi and
+    weights come from _folder_arrays. Returns (T, F) confidences.
+    """
+    value = features[:, None, :]
+    range_size = hi - lo
+
+    # Inside range: perfect center = 1.0, edges = 0.7
+    half = np.where(range_size > 0, range_size / 2, 1.0)
+    inside = 1.0 - np.abs(value - (lo + hi) / 2) / half * 0.3
+    inside = np.where(range_size > 0, inside, 1.0)
+
+    # Outside range: penalty based on distance (at most one side is nonzero)
+    distance = (np.maximum(0, lo - value) + np.maximum(0, value - hi)) / (range_size + 0.01)
+    outside = np.maximum(0, 1.0 - distance * 1.5)
+
+    scores = np.where((lo <= value) & (value <= hi), inside, outside)
+
+    # Weighted combination, summed in the same order as the scalar version
+    weighted = (
+        scores[..., 0] * weights[:, 0] +
+        scores[..., 1] * weights[:, 1] +
+        scores[..., 2] * weights[:, 2] +
+        scores[..., 3] * weights[:, 3]
+    ) / weights.sum(axis=1)
+
+    # Hard requirements: BPM must be somewhat close
+    return np.where(scores[..., 0] < 0.2, 0.0, np.round(weighted, 3))
+
+
 def classify_all_tracks() -> dict:
     """Classify all analyzed tracks into DJ folders."""
     with get_db() as conn:
-        tracks = conn.execute("SELECT track_id FROM audio_features").fetchall()
+        # One read for every track's features; rows missing any of them
+        # can't be scored and keep their existing classifications
+        tracks = conn.execute("""
+            SELECT track_id, bpm, energy, valence, danceability
+            FROM audio_features
+            WHERE bpm IS NOT NULL AND energy IS NOT NULL
+              AND valence IS NOT NULL AND danceability IS NOT NULL
+        """).fetchall()
 
         results = {"classified": 0, "total": len(tracks)}
 
-        for (track_id,) in tracks:
-            folders = classify_track(track_id)
-
-            # Clear old classifications
-            conn.execute("DELETE FROM track_vibes WHERE track_id = ?", (track_id,))
-
-            # Store top 3 folder matches
-            for folder_name, confidence in folders[:3]:
-                vibe_id = conn.execute(
-                    "SELECT id FROM vibes WHERE name = ?", (folder_name,)
-                ).fetchone()
-                if vibe_id:
-                    conn.execute("""
-                        INSERT INTO track_vibes (track_id, vibe_id, confidence)
-                        VALUES (?, ?, ?)
-                    """, (track_id, vibe_id[0], confidence))
-
-            if folders:
+        # Score every track against every folder in one pass
+        features = np.array([tuple(row)[1:] for row in tracks], dtype=np.float64).reshape(-1, 4)
+        confidences = _folder_confidences(features, *_DJ_FOLDER_ARRAYS)
+        # Top 3 per track, best first; stable so ties keep DJ_FOLDERS order
+        top = np.argsort(-confidences, axis=1, kind="stable")[:, :3]
+        top_confidences = np.take_along_axis(confidences, top, axis=1)
+
+        rows = []
+        for row, folder_ids, folder_confidences in zip(
+            tracks, top.tolist(), top_confidences.tolist()
+        ):
+            # Keep matches over the minimum threshold
+            matches = [
+                (row[0], _DJ_FOLDER_NAMES[i], confidence)
+                for i, confidence in zip(folder_ids, folder_confidences)
+                if confidence > 0.3
+            ]
+            rows.extend(matches)
+
+            if matches:
                 results["classified"] += 1
 
+        # Stage matches by folder name and let SQLite resolve the vibe IDs,
+        # replacing old classifications in one pass
+        conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS _scores (
+                track_id TEXT, vibe_name TEXT, confidence REAL
+            )
+        """)
+        conn.execute("DELETE FROM _scores")
+        conn.executemany("INSERT INTO _scores VALUES (?, ?, ?)", rows)
+        conn.execute("""
+            DELETE FROM track_vibes
+            WHERE track_id IN (
+                SELECT track_id FROM audio_features
+                WHERE bpm IS NOT NULL AND energy IS NOT NULL
+                  AND valence IS NOT NULL AND danceability IS NOT NULL
+            )
+        """)
+        conn.execute("""
+            INSERT INTO track_vibes (track_id, vibe_id, confidence)
+            SELECT s.track_id, v.id, s.confidence
+            FROM _scores s
+            JOIN vibes v ON v.name = s.vibe_name
+        """)
+        conn.execute("DROP TABLE _scores")
+
         return results
 
 
-def get_folder_summary() -> list[dict]:
-    """Get summary of tracks per folder, ordered by total plays."""
+def get_folder_summary() -> list[sqlite3.Row]:
+    """
+    Get summary of tracks per folder, ordered by total plays.
+
+    Rows are returned as-is; index them by column name, or dict(row).
+    """
     with get_db() as conn:
+        # Aggregate track_vibes per folder first (in vibe_id index order),
+        # then attach the aggregates to each folder row
         rows = conn.execute("""
+            WITH per_vibe AS (
+                SELECT
+                    tv.vibe_id,
+                    COUNT(*) as track_count,
+                    SUM(ts.play_count) as total_plays,
+                    AVG(af.bpm) as avg_bpm,
+                    MIN(af.bpm) as min_bpm,
+                    MAX(af.bpm) as max_bpm
+                FROM track_vibes tv
+                LEFT JOIN audio_features af ON tv.track_id = af.track_id
+                LEFT JOIN track_stats ts ON tv.track_id = ts.track_id
+                GROUP BY tv.vibe_id
+            )
             SELECT
                 v.name,
                 v.description,
-                COUNT(DISTINCT tv.track_id) as track_count,
-                COALESCE(SUM(ts.play_count), 0) as total_plays,
-                ROUND(AVG(af.bpm), 1) as avg_bpm,
-                ROUND(MIN(af.bpm), 0) as min_bpm,
-                ROUND(MAX(af.bpm), 0) as max_bpm
+                COALESCE(p.track_count, 0) as track_count,
+                COALESCE(p.total_plays, 0) as total_plays,
+                ROUND(p.avg_bpm, 1) as avg_bpm,
+                ROUND(p.min_bpm, 0) as min_bpm,
+                ROUND(p.max_bpm, 0) as max_bpm
             FROM vibes v
-            LEFT JOIN track_vibes tv ON v.id = tv.vibe_id
-            LEFT JOIN audio_features af ON tv.track_id = af.track_id
-            LEFT JOIN track_stats ts ON tv.track_id = ts.track_id
-            GROUP BY v.id
+            LEFT JOIN per_vibe p ON p.vibe_id = v.id
             ORDER BY total_plays DESC
         """).fetchall()
 
-        return [dict(row) for row in rows]
+        return rows
 
 
-def get_tracks_in_folder(folder_name: str, bpm_min: float = 0, bpm_max: float = 300) -> list[dict]:
-    """Get tracks in a folder, optionally filtered by BPM."""
+def get_tracks_in_folder(
+    folder_name: str, bpm_min: float = 0, bpm_max: float = 300
+) -> list[sqlite3.Row]:
+    """Get tracks in a folder (as rows), optionally filtered by BPM."""
     with get_db() as conn:
         rows = conn.execute("""
             SELECT
@@ -371,70 +527,71 @@ def get_tracks_in_folder(folder_name: str, bpm_min: float = 0, bpm_max: float =
                 af.bpm, af.energy, af.valence, af.key, af.mode,
                 tv.confidence,
                 COALESCE(ts.play_count, 0) as play_count
-            FROM tracks t
-            JOIN track_vibes tv ON t.id = tv.track_id
-            JOIN vibes v ON tv.vibe_id = v.id
+            FROM track_vibes tv
+            JOIN tracks t ON t.id = tv.track_id
             JOIN audio_features af ON t.id = af.track_id
             LEFT JOIN track_stats ts ON t.id = ts.track_id
-            WHERE v.name = ?
+            -- Resolve the name first so track_vibes is searched by vibe_id
+            WHERE tv.vibe_id = (SELECT id FROM vibes WHERE name = ?)
               AND af.bpm >= ? AND af.bpm <= ?
             ORDER BY ts.play_count DESC, tv.confidence DESC
         """, (folder_name, bpm_min, bpm_max)).fetchall()
 
-        return [dict(row) for row in rows]
+        return rows
 
 
-def get_bpm_buckets_for_folder(folder_name: str, bucket_size: int = 5) -> list[dict]:
-    """Get BPM distribution within a folder."""
+def get_bpm_buckets_for_folder(folder_name: str, bucket_size: int = 5) -> list[sqlite3.Row]:
+    """Get BPM distribution within a folder, as rows."""
     with get_db() as conn:
         rows = conn.execute("""
+            WITH bucketed AS (
+                SELECT
+                    CAST(af.bpm / ?1 AS INT) * ?1 as bpm_bucket,
+                    COUNT(*) as track_count,
+                    SUM(COALESCE(ts.play_count, 0)) as total_plays
+                FROM tracks t
+                JOIN track_vibes tv ON t.id = tv.track_id
+                JOIN vibes v ON tv.vibe_id = v.id
+                JOIN audio_features af ON t.id = af.track_id
+                LEFT JOIN track_stats ts ON t.id = ts.track_id
+                WHERE v.name = ?2
+                GROUP BY bpm_bucket
+            )
             SELECT
-                CAST(af.bpm / ? AS INT) * ? as bpm_bucket,
-                COUNT(*) as track_count,
-                SUM(COALESCE(ts.play_count, 0)) as total_plays
-            FROM tracks t
-            JOIN track_vibes tv ON t.id = tv.track_id
-            JOIN vibes v ON tv.vibe_id = v.id
-            JOIN audio_features af ON t.id = af.track_id
-            LEFT JOIN track_stats ts ON t.id = ts.track_id
-            WHERE v.name = ?
-            GROUP BY bpm_bucket
+                bpm_bucket || '-' || (bpm_bucket + ?1) as bpm_range,
+                track_count,
+                total_plays
+            FROM bucketed
             ORDER BY total_plays DESC
-        """, (bucket_size, bucket_size, folder_name)).fetchall()
+        """, (bucket_size, folder_name)).fetchall()
 
-        return [
-            {
-                "bpm_range": f"{row['bpm_bucket']}-{row['bpm_bucket'] + bucket_size}",
-                "track_count": row["track_count"],
-                "total_plays": row["total_plays"],
-            }
-            for row in rows
-        ]
+        return rows
 
 
-def print_folder_tree():
-    """Print DJ folders organized by category."""
-    categories = {
-        "SET POSITION": ["Openers", "Builders", "Peak Time", "Weapons", "Closers"],
-        "TEXTURE": ["Organic", "Synthetic", "Gritty"],
-        "RHYTHM": ["4x4 Locked", "Broken Beat", "Halftime / Slow", "Fast & Chaotic"],
-        "EMOTIONAL": ["Melancholic", "Euphoric", "Hypnotic", "Aggressive"],
-        "FUNCTIONAL": ["Transitions", "Curveballs"],
-    }
-
+@lru_cache(maxsize=1)
+def _folder_tree() -> str:
+    """The text print_folder_tree prints; DJ_FOLDERS is fixed, so built once."""
     folder_map = {f.name: f for f in DJ_FOLDERS}
+    bar = "=" * 60
 
-    for category, folder_names in categories.items():
-        print(f"\n{'='*60}")
-        print(f"  {category}")
-        print(f"{'='*60}")
+    lines = []
+    for category, folder_names in DJ_CATEGORIES.items():
+        lines += [f"\n{bar}", f"  {category}", bar]
         for name in folder_names:
             if name in folder_map:
                 f = folder_map[name]
-                print(f"\n  {f.name}")
-                print(f"    {f.description[:70]}...")
-                print(f"    BPM: {f.bpm_min:.0f}-{f.bpm_max:.0f} | "
-                      f"Energy: {f.energy_min:.1f}-{f.energy_max:.1f}")
+                lines += [
+                    f"\n  {f.name}",
+                    f"    {f.description[:70]}...",
+                    f"    BPM: {f.bpm_min:.0f}-{f.bpm_max:.0f} | "
+                    f"Energy: {f.energy_min:.1f}-{f.energy_max:.1f}",
+                ]
+    return "\n".join(lines)
+
+
+def print_folder_tree():
+    """Print DJ folders organized by category."""
+    print(_folder_tree())
 
 
 if __name__ == "__main__":
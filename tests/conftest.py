@@ -1,20 +1,76 @@
+import itertools
+import sqlite3
 import sys
 import pytest
-import tempfile
 from pathlib import Path
+from unittest.mock import MagicMock, patch
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
 
 @pytest.fixture
-def temp_db(tmp_path, monkeypatch):
-    """Create a temporary database for testing."""
+def temp_db_file(tmp_path, monkeypatch):
+    """Create a temporary on-disk database (for file-level behaviour like WAL)."""
     import database
     db_path = tmp_path / "test_library.db"
     monkeypatch.setattr(database, "DB_PATH", db_path)
     database.init_db()
-    return db_path
+    yield db_path
+    database.close_db()
+
+
+@pytest.fixture(scope="session")
+def _schema_template(tmp_path_factory):
+    """In-memory copy of a freshly initialized database, built once per session."""
+    import database
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(database, "DB_PATH", tmp_path_factory.mktemp("schema") / "template.db")
+        database.init_db()
+        template = sqlite3.connect(":memory:")
+        with database.get_db() as conn:
+            conn.backup(template)
+        database.close_db()
+    yield template
+    template.close()
+
+
+_memory_db_ids = itertools.count()
+
+
+@pytest.fixture
+def temp_db(_schema_template, monkeypatch):
+    """
+    Create a temporary in-memory database for testing.
+
+    Each test gets its own shared-cache memory database, restored from the
+    session's schema template, so no test touches the disk or re-runs DDL.
+    """
+    import database
+    uri = f"file:test_library_{next(_memory_db_ids)}?mode=memory&cache=shared"
+    # Holds the database open for the whole test
+    keeper = sqlite3.connect(uri, uri=True)
+    _schema_template.backup(keeper)
+
+    def connect():
+        conn = sqlite3.connect(uri, uri=True)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    monkeypatch.setattr(database, "_connect", connect)
+    monkeypatch.setattr(database, "DB_PATH", uri)
+    yield uri
+    database.close_db()
+    keeper.close()
+
+
+@pytest.fixture
+def db_conn(temp_db):
+    """A connection to temp_db for assertion queries, outside get_db."""
+    import database
+    conn = database._connect()
+    yield conn
+    conn.close()
 
 
 @pytest.fixture
@@ -48,57 +104,99 @@ def sample_tracks():
     ]
 
 
-@pytest.fixture
-def mock_spotify_client(mocker):
-    """Mock Spotify client for testing without API calls."""
-    mock_client = mocker.MagicMock()
-
-    mock_client.current_user.return_value = {
-        "id": "test_user",
-        "display_name": "Test User",
-        "followers": {"total": 100},
-    }
+# Canned Spotify API responses served by mock_spotify_client
+_CURRENT_USER = {
+    "id": "test_user",
+    "display_name": "Test User",
+    "followers": {"total": 100},
+}
 
-    mock_client.current_user_recently_played.return_value = {
-        "items": [
-            {
-                "played_at": "2024-01-15T12:00:00Z",
-                "track": {
-                    "id": "track1",
-                    "name": "Recent Track 1",
-                    "artists": [{"name": "Artist 1"}],
-                    "album": {"name": "Album 1"},
-                    "duration_ms": 200000,
-                    "uri": "spotify:track:track1",
-                },
+_RECENTLY_PLAYED = {
+    "items": [
+        {
+            "played_at": "2024-01-15T12:00:00Z",
+            "track": {
+                "id": "track1",
+                "name": "Recent Track 1",
+                "artists": [{"name": "Artist 1"}],
+                "album": {"name": "Album 1"},
+                "duration_ms": 200000,
+                "uri": "spotify:track:track1",
             },
-            {
-                "played_at": "2024-01-15T11:00:00Z",
-                "track": {
-                    "id": "track2",
-                    "name": "Recent Track 2",
-                    "artists": [{"name": "Artist 2"}, {"name": "Artist 2b"}],
-                    "album": {"name": "Album 2"},
-                    "duration_ms": 180000,
-                    "uri": "spotify:track:track2",
-                },
+        },
+        {
+            "played_at": "2024-01-15T11:00:00Z",
+            "track": {
+                "id": "track2",
+                "name": "Recent Track 2",
+                "artists": [{"name": "Artist 2"}, {"name": "Artist 2b"}],
+                "album": {"name": "Album 2"},
+                "duration_ms": 180000,
+                "uri": "spotify:track:track2",
             },
-        ]
-    }
+        },
+    ]
+}
 
-    mock_client.current_user_top_tracks.return_value = {
-        "items": [
-            {
-                "id": f"top{i}",
-                "name": f"Top Track {i}",
-                "artists": [{"name": f"Top Artist {i}"}],
-                "album": {"name": f"Top Album {i}"},
-                "duration_ms": 200000,
-                "popularity": 80 - i * 5,
-                "uri": f"spotify:track:top{i}",
-            }
-            for i in range(3)
-        ]
-    }
+_TOP_TRACKS = {
+    "items": [
+        {
+            "id": f"top{i}",
+            "name": f"Top Track {i}",
+            "artists": [{"name": f"Top Artist {i}"}],
+            "album": {"name": f"Top Album {i}"},
+            "duration_ms": 200000,
+            "popularity": 80 - i * 5,
+            "uri": f"spotify:track:top{i}",
+        }
+        for i in range(3)
+    ]
+}
 
+
+@pytest.fixture(scope="session")
+def _spotify_client():
+    """Mock Spotify client, built once per session."""
+    mock_client = MagicMock()
+    mock_client.current_user.return_value = _CURRENT_USER
+    # No test inspects these calls, so a plain function skips call recording
+    mock_client.current_user_recently_played = lambda *args, **kwargs: _RECENTLY_PLAYED
+    mock_client.current_user_top_tracks.return_value = _TOP_TRACKS
     return mock_client
+
+
+@pytest.fixture
+def mock_spotify_client(_spotify_client):
+    """
+    Mock Spotify client for testing without API calls.
+
+    Shared across tests with its call history cleared for each one; tests
+    that change a response should use mocker.patch.object so it's undone.
+    """
+    _spotify_client.reset_mock()
+    return _spotify_client
+
+
+@pytest.fixture(autouse=True)
+def _clear_spotify_client_cache():
+    """Start every test without a real Spotify client cached by get_spotify_client."""
+    import spotify_auth
+    spotify_auth.get_spotify_client.cache_clear()
+    yield
+    spotify_auth.get_spotify_client.cache_clear()
+
+
+@pytest.fixture(scope="module")
+def _spotify_history_patch(_spotify_client):
+    """Point spotify_history at the mock client, once per test module."""
+    import spotify_history
+    with patch.object(
+        spotify_history, "get_spotify_client", return_value=_spotify_client
+    ):
+        yield _spotify_client
+
+
+@pytest.fixture
+def patch_spotify_client(_spotify_history_patch, mock_spotify_client):
+    """Make spotify_history use mock_spotify_client instead of the real API."""
+    return mock_spotify_client
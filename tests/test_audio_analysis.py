@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import soundfile as sf
+import audio_analysis
+
+_SR = audio_analysis.ANALYSIS_SR
+
+
+@pytest.fixture
+def ramp_wav(tmp_path):
+    """A 10 s mono file whose sample value encodes its position in seconds."""
+    path = tmp_path / "ramp.wav"
+    y = np.arange(10 * _SR, dtype=np.float32) / (10 * _SR)
+    sf.write(path, y, _SR, subtype="FLOAT")
+    return path
+
+
+class TestLoadAudio:
+    def test_offset_without_duration(self, ramp_wav):
+        """An offset alone should read from there to the end."""
+        y = audio_analysis.load_audio(ramp_wav, offset=4.0)
+
+        assert len(y) == 6 * _SR
+        assert y[0] == pytest.approx(0.4)
+
+    def test_window_moves_back_for_short_files(self, ramp_wav):
+        """A window running past the end should be moved back to fit."""
+        y = audio_analysis.load_audio(ramp_wav, offset=8.0, duration=5.0)
+
+        assert len(y) == 5 * _SR
+        assert y[0] == pytest.approx(0.5)
+
+    def test_offset_past_end_reads_whole_file(self, ramp_wav):
+        """An offset past the end should fall back to the start."""
+        y = audio_analysis.load_audio(ramp_wav, offset=50.0)
+
+        assert len(y) == 10 * _SR
+        assert y[0] == 0.0
+
+
+class TestStftOut:
+    def test_reuses_buffer_for_default_window(self):
+        """Default-window spectrograms should share one buffer per thread."""
+        n_bins = 1 + audio_analysis.N_FFT // 2
+
+        first = audio_analysis._stft_out(n_bins, 100)
+        second = audio_analysis._stft_out(n_bins, audio_analysis._STFT_MAX_FRAMES)
+
+        assert first is second
+
+    def test_longer_signals_get_a_fresh_array(self):
+        """Buffers larger than the default window should not be kept."""
+        n_bins = 1 + audio_analysis.N_FFT // 2
+        n_frames = audio_analysis._STFT_MAX_FRAMES + 1
+
+        big = audio_analysis._stft_out(n_bins, n_frames)
+
+        assert big.shape == (n_bins, n_frames)
+        assert audio_analysis._stft_out(n_bins, 100) is not big
+
+    def test_threads_get_their_own_buffer(self):
+        """Concurrent analyses must not write into each other's spectrogram."""
+        n_bins = 1 + audio_analysis.N_FFT // 2
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            other = pool.submit(audio_analysis._stft_out, n_bins, 100).result()
+
+        assert audio_analysis._stft_out(n_bins, 100) is not other
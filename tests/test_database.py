@@ -33,6 +33,66 @@ class TestDatabaseInit:
         assert "idx_plays_track" in index_names
         assert "idx_audio_bpm" in index_names
 
+    def test_init_enables_wal(self, temp_db_file):
+        """Database init should switch the journal to WAL mode."""
+        with database.get_db() as conn:
+            mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+
+        assert mode == "wal"
+
+    def test_init_adds_missing_columns(self, temp_db):
+        """init_db should add new columns to tables from an older schema."""
+        with database.get_db() as conn:
+            conn.execute("ALTER TABLE audio_features DROP COLUMN file_mtime")
+
+        database.init_db()
+
+        with database.get_db() as conn:
+            columns = {
+                row["name"]
+                for row in conn.execute("PRAGMA table_info(audio_features)")
+            }
+        assert "file_mtime" in columns
+
+    def test_init_backfills_play_hours(self, temp_db, sample_track):
+        """Adding hour_of_day to an old plays table should backfill it."""
+        with database.get_db() as conn:
+            conn.execute("DROP INDEX idx_plays_hour")
+            conn.execute("ALTER TABLE plays DROP COLUMN hour_of_day")
+            conn.execute(
+                "INSERT INTO plays (track_id, played_at) VALUES (?, ?)",
+                (sample_track["id"], "2024-01-15T07:15:00Z"),
+            )
+
+        database.init_db()
+
+        with database.get_db() as conn:
+            play = conn.execute("SELECT hour_of_day FROM plays").fetchone()
+        assert play["hour_of_day"] == 7
+
+
+class TestGetDb:
+    def test_connection_reused(self, temp_db):
+        """Repeated get_db calls on one thread should share a connection."""
+        with database.get_db() as first:
+            pass
+        with database.get_db() as second:
+            assert second is first
+
+    def test_rollback_on_error(self, temp_db, sample_track):
+        """An exception inside get_db should discard uncommitted writes."""
+        with pytest.raises(RuntimeError):
+            with database.get_db() as conn:
+                conn.execute(
+                    "INSERT INTO tracks (id, name, artist) VALUES (?, ?, ?)",
+                    (sample_track["id"], sample_track["name"], sample_track["artist"]),
+                )
+                raise RuntimeError("boom")
+
+        with database.get_db() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+        assert count == 0
+
 
 class TestUpsertTrack:
     def test_insert_new_track(self, temp_db, sample_track):
@@ -89,6 +149,16 @@ class TestRecordPlay:
         assert play is not None
         assert play["played_at"] == "2024-01-15T12:00:00Z"
 
+    def test_record_play_stores_hour(self, temp_db, sample_track):
+        """Should store the hour of day the play happened in."""
+        database.upsert_track(sample_track)
+        database.record_play(sample_track["id"], "2024-01-15T23:30:00Z")
+
+        with database.get_db() as conn:
+            play = conn.execute("SELECT hour_of_day FROM plays").fetchone()
+
+        assert play["hour_of_day"] == 23
+
     def test_record_play_updates_stats(self, temp_db, sample_track):
         """Should update track stats."""
         database.upsert_track(sample_track)
@@ -116,6 +186,31 @@ class TestRecordPlay:
         assert count == 1
 
 
+class TestBulkWrites:
+    def test_upsert_tracks_bulk(self, temp_db, sample_tracks):
+        """Should insert every track in one call."""
+        database.upsert_tracks_bulk(sample_tracks)
+
+        assert database.get_stats()["total_tracks"] == len(sample_tracks)
+
+    def test_record_plays_bulk(self, temp_db, sample_tracks):
+        """Should record every play and aggregate stats per track."""
+        database.upsert_tracks_bulk(sample_tracks)
+        plays = [(t["id"], t["played_at"]) for t in sample_tracks]
+        plays.append((sample_tracks[0]["id"], "2024-02-01T12:00:00Z"))
+
+        database.record_plays_bulk(plays)
+
+        with database.get_db() as conn:
+            stats = conn.execute(
+                "SELECT * FROM track_stats WHERE track_id = ?", (sample_tracks[0]["id"],)
+            ).fetchone()
+
+        assert database.get_stats()["total_plays"] == len(plays)
+        assert stats["play_count"] == 2
+        assert stats["last_played"] == "2024-02-01T12:00:00Z"
+
+
 class TestSaveTopTracks:
     def test_save_top_tracks(self, temp_db, sample_tracks):
         """Should save top tracks with rankings."""
@@ -0,0 +1,76 @@
+import pytest
+import library_matcher
+
+_FILENAMES = [
+    "Daft Punk - Dont Stop.mp3",
+    "Four Tet - Baby.mp3",
+    "01 Bicep - Glue.flac",
+    "Fred again.. - Delilah (pull me out of this).mp3",
+    "Overmono - So U Kno.wav",
+    "Untitled Loop.mp3",
+]
+
+
+@pytest.fixture
+def library(tmp_path):
+    """A music directory of empty files with real-world style names."""
+    for name in _FILENAMES:
+        (tmp_path / name).touch()
+    return library_matcher.scan_music_directory(tmp_path)
+
+
+def _best_without_prefilter(name, artist, files, threshold):
+    """Score every file the way match_track_to_file does, with no prefilter."""
+    name_norm = library_matcher.normalize_string(name)
+    artist_norm = library_matcher.normalize_string(artist)
+    best = None
+    for file in files:
+        title_score = library_matcher.similarity_norm(name_norm, file["title_norm"])
+        if file["artist_guess"] and artist:
+            artist_score = library_matcher.similarity_norm(artist_norm, file["artist_norm"])
+            score = title_score * 0.6 + artist_score * 0.4
+        else:
+            score = title_score * 0.8
+        if score >= threshold and (best is None or score > best[1]):
+            best = (file["filename"], score)
+    return best
+
+
+class TestMatchTrackToFile:
+    @pytest.mark.parametrize("name,artist,filename", [
+        ("Don't Stop", "Daft Punk", "Daft Punk - Dont Stop.mp3"),
+        ("Babys", "Four Tet", "Four Tet - Baby.mp3"),
+        ("Glue", "Bicep", "01 Bicep - Glue.flac"),
+    ])
+    def test_matches_near_miss_titles(self, library, name, artist, filename):
+        """Apostrophes, plurals and short titles should still match."""
+        match = library_matcher.match_track_to_file(name, artist, library)
+
+        assert match is not None
+        assert match["filename"] == filename
+
+    def test_no_match_below_threshold(self, library):
+        """Unrelated tracks should not match anything."""
+        match = library_matcher.match_track_to_file("Windowlicker", "Aphex Twin", library)
+
+        assert match is None
+
+    @pytest.mark.parametrize("threshold", [0.5, 0.7, 0.9])
+    @pytest.mark.parametrize("name,artist", [
+        ("Don't Stop", "Daft Punk"),
+        ("Babys", "Four Tet"),
+        ("Delilah", "Fred again.."),
+        ("So U Know", "Overmono"),
+        ("Untitled", ""),
+        ("Glue (Original Mix)", "Bicep"),
+    ])
+    def test_prefilter_matches_full_scan(self, library, name, artist, threshold):
+        """The prefilter should never change which file wins, or its score."""
+        expected = _best_without_prefilter(name, artist, library, threshold)
+
+        match = library_matcher.match_track_to_file(name, artist, library, threshold)
+
+        if expected is None:
+            assert match is None
+        else:
+            assert (match["filename"], match["score"]) == expected
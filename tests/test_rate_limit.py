@@ -0,0 +1,81 @@
+import time
+
+import requests
+
+import rate_limit
+
+
+class TestLeakyBucket:
+    def test_allows_burst_up_to_rate(self):
+        """Calls up to the rate should not block."""
+        bucket = rate_limit.LeakyBucket(rate=5, per=1.0, concurrent=5)
+
+        start = time.monotonic()
+        for _ in range(5):
+            with bucket:
+                pass
+
+        assert time.monotonic() - start < 0.1
+
+    def test_throttles_beyond_rate(self):
+        """Calls beyond the rate should wait for the bucket to refill."""
+        bucket = rate_limit.LeakyBucket(rate=5, per=0.5, concurrent=5)
+
+        start = time.monotonic()
+        for _ in range(6):
+            with bucket:
+                pass
+
+        assert time.monotonic() - start >= 0.09
+
+    def test_pause_holds_callers(self):
+        """pause() should delay the next call."""
+        bucket = rate_limit.LeakyBucket(rate=5, per=1.0, concurrent=5)
+        bucket.pause(0.1)
+
+        start = time.monotonic()
+        with bucket:
+            pass
+
+        assert time.monotonic() - start >= 0.09
+
+
+class TestRateLimitedSession:
+    def _response(self, status, headers=None):
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers or {})
+        return response
+
+    def test_retries_after_429(self, mocker):
+        """A 429 should be retried after its Retry-After delay."""
+        bucket = rate_limit.LeakyBucket(rate=10, per=1.0, concurrent=2)
+        session = rate_limit.RateLimitedSession(bucket)
+        send = mocker.patch.object(
+            requests.Session,
+            "request",
+            side_effect=[
+                self._response(429, {"Retry-After": "0"}),
+                self._response(200),
+            ],
+        )
+
+        response = session.request("GET", "https://api.spotify.com/v1/me")
+
+        assert response.status_code == 200
+        assert send.call_count == 2
+
+    def test_gives_up_after_max_retries(self, mocker):
+        """Persistent 429s should be returned once retries run out."""
+        bucket = rate_limit.LeakyBucket(rate=10, per=1.0, concurrent=2)
+        session = rate_limit.RateLimitedSession(bucket, max_retries=2)
+        send = mocker.patch.object(
+            requests.Session,
+            "request",
+            return_value=self._response(429, {"Retry-After": "0"}),
+        )
+
+        response = session.request("GET", "https://api.spotify.com/v1/me")
+
+        assert response.status_code == 429
+        assert send.call_count == 3
@@ -1,12 +1,11 @@
-import pytest
 import spotify_auth
 
 
 class TestTestConnection:
     def test_returns_user_info(self, mocker, mock_spotify_client):
         """Should return user info dictionary."""
-        mocker.patch(
-            "spotify_auth.get_spotify_client", return_value=mock_spotify_client
+        mocker.patch.object(
+            spotify_auth, "get_spotify_client", return_value=mock_spotify_client
         )
 
         result = spotify_auth.test_connection()
@@ -17,8 +16,8 @@ class TestTestConnection:
 
     def test_calls_current_user(self, mocker, mock_spotify_client):
         """Should call current_user on the client."""
-        mocker.patch(
-            "spotify_auth.get_spotify_client", return_value=mock_spotify_client
+        mocker.patch.object(
+            spotify_auth, "get_spotify_client", return_value=mock_spotify_client
         )
 
         spotify_auth.test_connection()
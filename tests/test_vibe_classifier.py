@@ -0,0 +1,112 @@
+import numpy as np
+import database
+import vibe_classifier
+from vibe_classifier import DJ_FOLDERS, DJFolder
+
+# A zero-width range exercises the range_size == 0 branch
+_POINT_FOLDER = DJFolder(
+    name="Point", description="", bpm_min=120, bpm_max=120,
+    energy_min=0.5, energy_max=0.5,
+)
+_FOLDERS = [*DJ_FOLDERS, _POINT_FOLDER]
+
+
+def _edge_features() -> np.ndarray:
+    """Feature rows on, just inside and just outside every folder's ranges."""
+    values = {0: {0.0, 90.0, 128.0, 300.0}}
+    values.update({j: {0.0, 0.5, 1.0} for j in (1, 2, 3)})
+    lo, hi, _ = vibe_classifier._folder_arrays(_FOLDERS)
+    for j in range(4):
+        for bound in [*lo[:, j], *hi[:, j]]:
+            values[j].update({bound, bound - 1e-3, bound + 1e-3})
+    for f in _FOLDERS:
+        # Either side of where the BPM score crosses the 0.2 gate
+        gate = (1.0 - 0.2) / 1.5 * (f.bpm_max - f.bpm_min + 0.01)
+        values[0].update({f.bpm_max + gate - 1e-6, f.bpm_max + gate + 1e-6,
+                          f.bpm_min - gate - 1e-6, f.bpm_min - gate + 1e-6})
+    rng = np.random.default_rng(0)
+    rows = [
+        [rng.choice(sorted(values[j])) for j in range(4)]
+        for _ in range(2000)
+    ]
+    return np.array(rows, dtype=np.float64)
+
+
+_FEATURES = _edge_features()
+
+
+def _expected(features: np.ndarray) -> np.ndarray:
+    """calculate_folder_confidence for every row against every folder."""
+    return np.array([
+        [vibe_classifier.calculate_folder_confidence(*row, folder) for folder in _FOLDERS]
+        for row in features.tolist()
+    ])
+
+
+class TestFolderConfidences:
+    def test_matches_scalar_confidence(self):
+        """The batch scorer should agree with calculate_folder_confidence to rounding."""
+        arrays = vibe_classifier._folder_arrays(_FOLDERS)
+
+        confidences = vibe_classifier._folder_confidences(_FEATURES, *arrays)
+
+        np.testing.assert_allclose(confidences, _expected(_FEATURES), atol=1e-3)
+
+    def test_bpm_gate_zeroes_far_tracks(self):
+        """A BPM far outside the folder's range should score 0 whatever else fits."""
+        folder = DJ_FOLDERS[0]
+        features = np.array([[folder.bpm_max + 200, 0.5, 0.5, 0.5]])
+
+        confidences = vibe_classifier._folder_confidences(
+            features, *vibe_classifier._folder_arrays([folder])
+        )
+
+        assert confidences[0, 0] == 0.0
+
+
+class TestMatchFolders:
+    def test_matches_scalar_confidence(self):
+        """Single-track matching should agree with calculate_folder_confidence."""
+        for row in _FEATURES[:300].tolist():
+            expected = sorted(
+                (
+                    (folder.name, confidence)
+                    for folder in _FOLDERS
+                    if (confidence := vibe_classifier.calculate_folder_confidence(*row, folder)) > 0.3
+                ),
+                key=lambda x: x[1],
+                reverse=True,
+            )
+
+            matches = dict(vibe_classifier._match_folders(*row, _FOLDERS))
+            assert matches.keys() == dict(expected).keys()
+            np.testing.assert_allclose(
+                [matches[name] for name, _ in expected],
+                [confidence for _, confidence in expected],
+                atol=1e-3,
+            )
+
+
+class TestClassifyAllTracks:
+    def test_skips_tracks_with_missing_features(self, temp_db, db_conn, sample_tracks):
+        """Rows missing a feature are left out and keep their classifications."""
+        database.upsert_tracks_bulk(sample_tracks[:2])
+        vibe_classifier.init_folders()
+        db_conn.executemany(
+            "INSERT INTO audio_features (track_id, bpm, energy, valence, danceability) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [("track0", 124.0, 0.8, 0.6, 0.8), ("track1", 124.0, None, 0.6, 0.8)],
+        )
+        db_conn.execute(
+            "INSERT INTO track_vibes (track_id, vibe_id, confidence) "
+            "SELECT 'track1', id, 0.9 FROM vibes WHERE name = 'Openers'"
+        )
+        db_conn.commit()
+
+        results = vibe_classifier.classify_all_tracks()
+
+        assert results == {"classified": 1, "total": 1}
+        kept = db_conn.execute(
+            "SELECT confidence FROM track_vibes WHERE track_id = 'track1'"
+        ).fetchall()
+        assert [row["confidence"] for row in kept] == [0.9]